@@ -0,0 +1,358 @@
+import os, sys, json, time, heapq, random, shutil, socket, argparse, tempfile, itertools, threading, subprocess
+from collections import deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+import yaml
+
+DEPLOY_BOT = Path(__file__).resolve().with_name("deploy_bot.py")
+TOKEN = "123456:benchmark"
+REPLY_METHODS = {"sendMessage", "sendPhoto", "editMessageText", "editMessageMedia"}
+
+# Benchmark runs measure our code, not Telegram's flood limits; later --bot-args win
+DEFAULT_BOT_ARGS = ["--rate", "1000000", "--chat-rate", "1000"]
+
+
+def make_tree(root, depth, fanout, media_every=0, media_kb=64, seed=1):
+    """Write a synthetic root-menu/ with ``fanout`` buttons per screen, ``depth`` levels deep.
+
+    Every ``media_every``-th node gets its own image of about ``media_kb`` KiB. Returns the node count.
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    root.mkdir(parents=True)
+    (root / "main_menu.txt").write_text("Benchmark menu", encoding="utf-8")
+    media_dir = root.parent / "media"
+    counter = itertools.count(1)
+
+    def walk(folder, level):
+        children = []
+        for i in range(fanout if level <= depth else 0):
+            child = folder / f"n{i}"
+            child.mkdir()
+            n = next(counter)
+            media = ""
+            if media_every and n % media_every == 0:
+                media_dir.mkdir(exist_ok=True)
+                media = f"media/{n}.png"
+                (media_dir / f"{n}.png").write_bytes(b"\x89PNG\r\n\x1a\n" + rng.randbytes(media_kb * 1024))
+            info = {"label": f"Item {n}", "description": f"Screen {n}: " + "lorem ipsum " * 10,
+                    "media": media, "x": float(level * 250), "y": float(n * 120)}
+            info["children"] = walk(child, level + 1)
+            with open(child / "info.yaml", "w", encoding="utf-8") as f:
+                yaml.safe_dump(info, f)
+            children.append(child.relative_to(root).as_posix())
+        return children
+
+    walk(root, 1)
+    return next(counter) - 1
+
+
+class FakeBotAPI(ThreadingHTTPServer):
+    """Answers the Bot API methods deploy_bot.py uses, each after ``latency`` seconds.
+
+    Updates given to ``push`` are handed out by getUpdates; every screen the bot sends or
+    edits is reported to ``on_reply(chat_id, message)``.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, on_reply=None):
+        super().__init__(("127.0.0.1", 0), FakeBotAPIHandler)
+        self.latency, self.on_reply = latency, on_reply
+        self.updates = deque()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.file_ids = itertools.count(1)
+        self.cond = threading.Condition()
+        self.polled = threading.Event()
+        self.lock = threading.Lock()
+        self.calls, self.upload_bytes = {}, 0
+
+    def handle_error(self, request, client_address):
+        pass  # the bot was killed mid-request at the end of a run
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def push(self, update):
+        with self.cond:
+            update["update_id"] = next(self.update_ids)
+            self.updates.append(update)
+            self.cond.notify_all()
+
+    def get_updates(self, params):
+        offset, timeout = int(params.get("offset") or 0), float(params.get("timeout") or 0)
+        deadline = time.monotonic() + min(timeout, 1.0)
+        self.polled.set()
+        with self.cond:
+            while self.updates and self.updates[0]["update_id"] < offset:
+                self.updates.popleft()
+            while not self.updates and time.monotonic() < deadline:
+                self.cond.wait(deadline - time.monotonic())
+            return list(itertools.islice(self.updates, 100))
+
+    def call(self, method, params, files):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.upload_bytes += sum(len(data) for data in files.values())
+        if method == "getUpdates":
+            return self.get_updates(params)
+        if self.latency:
+            time.sleep(self.latency)
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        if method not in REPLY_METHODS:
+            return True
+        chat_id = int(params["chat_id"])
+        message = {"message_id": int(params.get("message_id") or next(self.message_ids)), "date": 1,
+                   "chat": {"id": chat_id, "type": "private"}}
+        if params.get("reply_markup"):
+            message["reply_markup"] = json.loads(params["reply_markup"])
+        if method in ("sendPhoto", "editMessageMedia"):
+            media = json.loads(params["media"]) if method == "editMessageMedia" else params
+            photo = media.get("photo") or media.get("media")
+            if not photo or photo.startswith("attach://"):  # an upload rather than a file_id
+                photo = f"file{next(self.file_ids)}"
+            message["photo"] = [{"file_id": photo, "file_unique_id": photo, "width": 1, "height": 1}]
+            message["caption"] = media.get("caption", "")
+        else:
+            message["text"] = params.get("text", "")
+        if self.on_reply:
+            self.on_reply(chat_id, message)
+        return message
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per call
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        method = url.path.rsplit("/", 1)[-1]
+        params, files = dict(parse_qsl(url.query)), {}
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/"):
+            form = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+            for part in form.iter_parts():
+                name, data = part.get_param("name", header="content-disposition"), part.get_payload(decode=True)
+                if part.get_filename():
+                    files[name] = data
+                else:
+                    params[name] = data.decode("utf-8")
+        elif content_type.startswith("application/json"):
+            params.update(json.loads(body or b"{}"))
+        elif body:
+            params.update(parse_qsl(body.decode("utf-8")))
+        out = json.dumps({"ok": True, "result": self.server.call(method, params, files)}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Users:
+    """Simulated users: each taps a random button of the screen it was last shown and waits for the next one."""
+
+    def __init__(self, api, count, think=0.0, timeout=10.0, seed=1):
+        self.api, self.think, self.timeout = api, think, timeout
+        self.rng = random.Random(seed)
+        self.screens = {}   # chat id -> last message the bot showed
+        self.pending = {}   # chat id -> monotonic time the update was sent
+        self.due = []       # heap of (time, chat id) for the next action
+        self.cond = threading.Condition()
+        self.latencies, self.timeouts, self.recording = [], 0, False
+        self.chats = range(1000, 1000 + count)
+        api.on_reply = self.replied
+
+    def start(self):
+        with self.cond:
+            for chat_id in self.chats:
+                heapq.heappush(self.due, (time.monotonic(), chat_id))
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def replied(self, chat_id, message):
+        now = time.monotonic()
+        with self.cond:
+            sent = self.pending.pop(chat_id, None)
+            if sent is None:
+                return
+            if self.recording:
+                self.latencies.append(now - sent)
+            self.screens[chat_id] = message
+            heapq.heappush(self.due, (now + self.think, chat_id))
+            self.cond.notify()
+
+    def _expire(self, now):
+        for chat_id, sent in list(self.pending.items()):
+            if now - sent > self.timeout:
+                # No answer: count it and start over from /start
+                del self.pending[chat_id]
+                self.screens.pop(chat_id, None)
+                self.timeouts += self.recording
+                heapq.heappush(self.due, (now, chat_id))
+
+    def _run(self):
+        checked = time.monotonic()
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                if now - checked > 1.0:
+                    self._expire(now)
+                    checked = now
+                if not self.due or self.due[0][0] > now:
+                    self.cond.wait(min(1.0, self.due[0][0] - now) if self.due else 1.0)
+                    continue
+                ready = []
+                while self.due and self.due[0][0] <= now:
+                    chat_id = heapq.heappop(self.due)[1]
+                    self.pending[chat_id] = now
+                    ready.append(chat_id)
+            for chat_id in ready:
+                self.api.push(self._action(chat_id))
+
+    def _action(self, chat_id):
+        user = {"id": chat_id, "is_bot": False, "first_name": "User"}
+        chat = {"id": chat_id, "type": "private"}
+        screen = self.screens.get(chat_id)
+        buttons = [b for row in (screen or {}).get("reply_markup", {}).get("inline_keyboard", []) for b in row]
+        if not buttons:
+            return {"message": {"message_id": 1, "date": 1, "chat": chat, "from": user, "text": "/start",
+                                "entities": [{"type": "bot_command", "offset": 0, "length": 6}]}}
+        data = self.rng.choice(buttons)["callback_data"]
+        return {"callback_query": {"id": str(chat_id), "chat_instance": "bench", "from": user,
+                                   "data": data, "message": screen}}
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of ``pid`` and all its descendants (Linux only, else None)."""
+    try:
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+                except OSError:
+                    pass
+        tree, total = {pid}, 0
+        for _ in range(4):
+            tree |= {p for p, parent in parents.items() if parent in tree}
+        for p in tree:
+            try:
+                with open(f"/proc/{p}/statm") as f:
+                    total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except OSError:
+                pass
+        return total
+    except (OSError, ValueError):
+        return None
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_scenario(depth, fanout, users, duration, warmup=2.0, latency=0.0, think=0.0,
+                 media_every=0, media_kb=64, bot_args=(), seed=1):
+    workdir = Path(tempfile.mkdtemp(prefix="tgbench-"))
+    try:
+        nodes = make_tree(workdir / "root-menu", depth, fanout, media_every, media_kb, seed)
+        (workdir / "config.py").write_text(f'BOT_TOKEN="{TOKEN}"\n')
+        api = FakeBotAPI(latency)
+        threading.Thread(target=api.serve_forever, daemon=True).start()
+        load = Users(api, users, think, seed=seed)
+        with open(workdir / "bot.log", "wb") as log:
+            bot = subprocess.Popen([sys.executable, str(DEPLOY_BOT), "--api-server", api.url,
+                                    *DEFAULT_BOT_ARGS, *bot_args], cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + 120
+            while not api.polled.wait(0.5):
+                if bot.poll() is not None:
+                    raise RuntimeError(f"bot exited with code {bot.returncode}, see {workdir / 'bot.log'}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"bot did not start, see {workdir / 'bot.log'}")
+            load.start()
+            time.sleep(warmup)
+            calls_before = sum(api.calls.values()) - api.calls.get("getUpdates", 0)
+            load.recording, started, peak_rss = True, time.monotonic(), 0
+            while time.monotonic() - started < duration:
+                time.sleep(0.5)
+                peak_rss = max(peak_rss, process_tree_rss(bot.pid) or 0)
+                if bot.poll() is not None:
+                    raise RuntimeError(f"bot exited with code {bot.returncode}, see {workdir / 'bot.log'}")
+            load.recording = False
+            elapsed = time.monotonic() - started
+            calls = sum(api.calls.values()) - api.calls.get("getUpdates", 0) - calls_before
+        finally:
+            bot.kill()
+            bot.wait()
+            api.shutdown()
+        latencies = list(load.latencies)
+        result = {
+            "depth": depth, "fanout": fanout, "nodes": nodes, "users": users, "latency_ms": latency * 1000,
+            "bot_args": list(bot_args), "screens": len(latencies),
+            "throughput": len(latencies) / elapsed, "api_calls_per_s": calls / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000,
+            "timeouts": load.timeouts, "peak_rss_mb": peak_rss / 2 ** 20 if peak_rss else None,
+            "upload_mb": api.upload_bytes / 2 ** 20,
+        }
+    except BaseException:
+        # Left in place so bot.log, which the error points to, can still be read
+        print(f"Keeping {workdir} of the failed run", file=sys.stderr)
+        raise
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def report(results):
+    print(f"{'depth':>5} {'fanout':>6} {'nodes':>7} {'users':>5} {'screens/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'api/s':>8} {'timeouts':>8} {'rss MB':>7}")
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] else "n/a"
+        print(f"{r['depth']:>5} {r['fanout']:>6} {r['nodes']:>7} {r['users']:>5} {r['throughput']:>10.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['api_calls_per_s']:>8.1f} {r['timeouts']:>8} {rss:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drive deploy_bot.py with simulated users against a local fake Bot API and report "
+                    "throughput, latency and memory for synthetic menus of every depth x fanout given.")
+    parser.add_argument("--depth", type=int, nargs="+", default=[2, 3], help="menu levels below the main menu")
+    parser.add_argument("--fanout", type=int, nargs="+", default=[4, 12], help="buttons per screen")
+    parser.add_argument("--users", type=int, default=100, help="simulated users tapping concurrently")
+    parser.add_argument("--duration", type=float, default=10, help="seconds measured per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of load before measuring")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the fake Bot API takes per call")
+    parser.add_argument("--think", type=float, default=0, help="seconds a user waits before the next tap")
+    parser.add_argument("--media-every", type=int, default=0, help="give every Nth node an image (0: none)")
+    parser.add_argument("--media-kb", type=int, default=64, help="size of each image")
+    parser.add_argument("--bot-args", default="", help='extra deploy_bot.py arguments, e.g. "--processes 4"')
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE")
+    args = parser.parse_args()
+
+    results = []
+    for depth, fanout in itertools.product(args.depth, args.fanout):
+        print(f"Running depth={depth} fanout={fanout}…", file=sys.stderr)
+        results.append(run_scenario(depth, fanout, args.users, args.duration, args.warmup, args.latency,
+                                    args.think, args.media_every, args.media_kb, args.bot_args.split(), args.seed))
+    report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
@@ -0,0 +1,121 @@
+import time, asyncio, argparse
+from pathlib import Path
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from menu import MODULES_PATH, load_menu, node_key
+from bundle import load_bundle
+from media_cache import MediaCache
+from media_pipeline import Derivatives
+from outbound import OutboundScheduler, install, use_api_server
+from subscribers import SUBSCRIBERS_PATH, ChatLog
+
+JOBS_PATH = Path("broadcasts")
+
+
+def is_gone(e):
+    # The user blocked the bot, deleted their account or the chat no longer exists
+    return e.error_code == 403 or (e.error_code == 400 and "chat not found" in e.description.lower())
+
+
+async def broadcast(token, menu, node_id, subscribers, done, media_cache, concurrency=100, report_every=5.0):
+    """Send ``node_id``'s screen to every subscriber not yet in ``done`` and record each one there.
+
+    Sends run ``concurrency`` at a time; the installed OutboundScheduler keeps them to the rate limit.
+    Chats that are gone for good are unsubscribed. Returns the counts of sent, failed and removed chats.
+    """
+    _, text, media = menu.show(node_id)
+    keyboard = menu.keyboards[node_id]
+    has_media = bool(media) and Path(media).exists()
+    bot = AsyncTeleBot(token, parse_mode="Markdown")
+    chats = [chat_id for chat_id in subscribers if chat_id not in done]
+    stats = {"sent": 0, "failed": 0, "removed": 0}
+    print(f"[Broadcast] Sending {node_id or 'main menu'} to {len(chats)} chats ({len(done)} already done)")
+
+    async def send(chat_id):
+        try:
+            if has_media:
+                await media_cache.send_photo_async(bot, chat_id, media, caption=text, reply_markup=keyboard)
+            else:
+                await bot.send_message(chat_id, text, reply_markup=keyboard)
+        except ApiTelegramException as e:
+            if not is_gone(e):
+                # Left out of ``done``: a rerun of the job retries it
+                stats["failed"] += 1
+                print(f"[Broadcast] Could not send to {chat_id}: {e.description}")
+                return
+            subscribers.discard(chat_id)
+            stats["removed"] += 1
+        else:
+            stats["sent"] += 1
+        done.add(chat_id)
+
+    async def sender(queue):
+        for chat_id in queue:
+            await send(chat_id)
+
+    async def progress(started):
+        while True:
+            await asyncio.sleep(report_every)
+            finished = sum(stats.values())
+            rate = finished / (time.monotonic() - started)
+            eta = (len(chats) - finished) / rate if rate else float("inf")
+            print(f"[Broadcast] {finished}/{len(chats)}: {stats['sent']} sent, {stats['failed']} failed, "
+                  f"{stats['removed']} unsubscribed, {rate:.1f}/s, about {eta / 60:.0f} min left")
+
+    started = time.monotonic()
+    reporter = asyncio.create_task(progress(started))
+    try:
+        queue = iter(chats)
+        if has_media:
+            # Upload the file once; every other send reuses its file_id
+            for chat_id in queue:
+                await send(chat_id)
+                if media_cache.get(media):
+                    break
+        await asyncio.gather(*(sender(queue) for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+        await bot.close_session()
+    print(f"[Broadcast] Done in {time.monotonic() - started:.0f}s: {stats['sent']} sent, {stats['failed']} failed, "
+          f"{stats['removed']} unsubscribed")
+    return stats
+
+
+if __name__ == "__main__":
+    from deploy_bot import load_token
+
+    parser = argparse.ArgumentParser(description="Send a menu screen to every chat that ever pressed /start.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    send = sub.add_parser("send", help="broadcast a menu node; rerun the same job to resume it")
+    send.add_argument("node", help='node to send: its folder path under root-menu/, e.g. "Offers/Summer", or / for the main menu')
+    send.add_argument("--job", help="name under which progress is kept in broadcasts/ (default: derived from the node)")
+    send.add_argument("--restart", action="store_true", help="forget the job's progress and send to everyone again")
+    send.add_argument("--bundle", metavar="FILE", help="take the node from a compiled bundle instead of root-menu/")
+    send.add_argument("--rate", type=float, default=20,
+                      help="messages per second (default 20, leaving room for a bot running at the same time)")
+    send.add_argument("--concurrency", type=int, default=100, help="requests in flight at once")
+    send.add_argument("--api-server", metavar="URL", help="Bot API server to use instead of api.telegram.org")
+    sub.add_parser("count", help="print the number of subscribers")
+    sub.add_parser("compact", help="rewrite subscribers.log without removed chats")
+    args = parser.parse_args()
+
+    subscribers = ChatLog(SUBSCRIBERS_PATH)
+    if args.command == "count":
+        print(len(subscribers))
+    elif args.command == "compact":
+        subscribers.compact()
+        print(f"{len(subscribers)} subscribers, {SUBSCRIBERS_PATH.stat().st_size} bytes")
+    else:
+        menu = load_bundle(args.bundle)[0] if args.bundle else load_menu(MODULES_PATH)
+        node_id = args.node.strip("/")
+        if node_id not in menu.nodes:
+            parser.error(f"no menu node {args.node!r}")
+        JOBS_PATH.mkdir(exist_ok=True)
+        journal = JOBS_PATH / f"{args.job or node_key(node_id)}.sent"
+        if args.restart:
+            journal.unlink(missing_ok=True)
+        if args.api_server:
+            use_api_server(args.api_server)
+        install(OutboundScheduler(rate=args.rate, max_queue=max(1000, args.concurrency)))
+        media_cache = MediaCache(derivatives=Derivatives())
+        asyncio.run(broadcast(load_token(), menu, node_id, subscribers, ChatLog(journal), media_cache, args.concurrency))
@@ -0,0 +1,128 @@
+import json, mmap, os, argparse, threading
+from pathlib import Path
+from collections.abc import Mapping
+from menu import MODULES_PATH, Menu, MenuNode, load_menu
+from media_cache import file_digest
+
+MAGIC = b"TGMENU1\n"
+
+# Layout of a bundle file:
+#   MAGIC
+#   one JSON line: {"nodes": {node id: [offset, length]}, "keys": {...}, "media": {path: sha256}}
+#   node records, each a JSON array [MenuNode fields..., keyboard] at the indexed offset
+# Loading only parses the index; records are decoded from the mmap the first time they are used.
+
+
+def write_bundle(menu, path, media_hashes=False):
+    records, index, offset = [], {}, 0
+    for node_id, node in menu.nodes.items():
+        record = json.dumps([*node[:4], list(node.children), node.buttons_per_row, menu.keyboards[node_id]],
+                            ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        index[node_id] = [offset, len(record)]
+        records.append(record)
+        offset += len(record)
+    media = {}
+    if media_hashes:
+        media = {n.media: file_digest(n.media) for n in menu.nodes.values() if n.media and Path(n.media).is_file()}
+    header = json.dumps({"nodes": index, "keys": dict(menu.keys), "media": media},
+                        ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + header + b"\n")
+        f.writelines(records)
+    # Replace atomically: a running bot may still have the old file mapped
+    os.replace(tmp, path)
+
+
+def compile_bundle(root, path, media_hashes=False):
+    """Compile the menu folder ``root`` as the bot would load it into a bundle at ``path``."""
+    menu = load_menu(root)
+    write_bundle(menu, path, media_hashes)
+    return menu
+
+
+class _Records:
+    def __init__(self, mm, base, index):
+        self.mm, self.base, self.index, self.cache = mm, base, index, {}
+
+    def get(self, node_id):
+        record = self.cache.get(node_id)
+        if record is None:
+            offset, length = self.index[node_id]
+            start = self.base + offset
+            record = self.cache[node_id] = json.loads(self.mm[start:start + length])
+        return record
+
+
+class _LazyView(Mapping):
+    def __init__(self, records, decode):
+        self.records, self.decode = records, decode
+
+    def __getitem__(self, node_id):
+        return self.decode(self.records.get(node_id))
+
+    def __iter__(self):
+        return iter(self.records.index)
+
+    def __len__(self):
+        return len(self.records.index)
+
+
+def load_bundle(path):
+    """Map a compiled bundle into memory and return a Menu backed by it, plus its media hashes."""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a compiled menu bundle")
+    mm.seek(len(MAGIC))
+    header = json.loads(mm.readline())
+    records = _Records(mm, mm.tell(), header["nodes"])
+    menu = Menu(
+        _LazyView(records, lambda r: MenuNode(*r[:4], tuple(r[4]), r[5])),
+        header["keys"],
+        _LazyView(records, lambda r: r[6])
+    )
+    return menu, header["media"]
+
+
+class BundleLoader:
+    """MenuLoader counterpart for a compiled bundle: swaps in a new menu when the file is replaced."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.menu, self.media, self._stamp = None, {}, None
+        self._stop = threading.Event()
+
+    def reload(self):
+        st = self.path.stat()
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return False
+        self.menu, self.media = load_bundle(self.path)
+        self._stamp = stamp
+        return True
+
+    def watch(self, interval=2.0):
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    if self.reload():
+                        print(f"[Bot] Menu bundle reloaded ({len(self.menu.nodes)} nodes)")
+                except Exception as e:
+                    print(f"[Bot] Menu bundle reload failed, keeping previous menu: {e}")
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack root-menu/ into a single file deploy_bot.py can load with --bundle.")
+    parser.add_argument("command", choices=["compile"])
+    parser.add_argument("root", nargs="?", default=str(MODULES_PATH), help="menu folder (default: root-menu)")
+    parser.add_argument("-o", "--output", default="menu.bundle", help="bundle file to write (default: menu.bundle)")
+    parser.add_argument("--media-hashes", action="store_true", help="record a sha256 of every media file")
+    args = parser.parse_args()
+    menu = compile_bundle(args.root, args.output, args.media_hashes)
+    print(f"Compiled {len(menu.nodes)} nodes into {args.output}")
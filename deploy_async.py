@@ -0,0 +1,55 @@
+import asyncio
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from dispatcher import ChatLocks
+from webhook import WebhookServer
+from navigation import show_screen_async
+from sessions import navigate
+from metrics import UPDATES, UPDATE_SECONDS
+
+
+async def run_async(token, menu_loader, media_cache, sessions, subscribers, connections=100, webhook=None):
+    """Serve the same menu as deploy_bot.run_threaded from a single asyncio event loop.
+
+    All Bot API calls share one aiohttp session, so connections are kept alive and reused.
+    Session store and subscriber log calls may block (SQLite, Redis, disk) and run in worker threads.
+    """
+    asyncio_helper.REQUEST_LIMIT = connections
+    bot = AsyncTeleBot(token, parse_mode="Markdown")
+    chat_locks = ChatLocks()
+
+    @bot.message_handler(commands=["start"])
+    async def start(m):
+        menu = menu_loader.menu
+        UPDATES.inc(kind="message")
+        async with chat_locks.hold(m.chat.id):
+            with UPDATE_SECONDS.time(kind="message"):
+                await asyncio.to_thread(subscribers.add, m.chat.id)
+                await asyncio.to_thread(sessions.delete, m.chat.id)
+                await bot.send_message(m.chat.id, menu.nodes[""].description, reply_markup=menu.keyboards[""])
+
+    @bot.callback_query_handler(func=lambda c: True)
+    async def cb(call):
+        menu = menu_loader.menu
+        UPDATES.inc(kind="callback_query")
+        async with chat_locks.hold(call.message.chat.id):
+            with UPDATE_SECONDS.time(kind="callback_query"):
+                path, desc, media = await asyncio.to_thread(navigate, menu, sessions, call.message.chat.id, call.data)
+                await show_screen_async(bot, media_cache, call.message, desc, media, menu.keyboards[path])
+
+    try:
+        if webhook:
+            loop = asyncio.get_running_loop()
+            server = WebhookServer(
+                (webhook.listen, webhook.port), webhook.secret,
+                lambda updates: asyncio.run_coroutine_threadsafe(bot.process_new_updates(updates), loop)
+            )
+            await bot.set_webhook(url=webhook.url, secret_token=webhook.secret)
+            print(f"[Bot] Receiving webhook updates on {webhook.listen}:{webhook.port} on asyncio (deployment mode)…")
+            await asyncio.to_thread(server.serve_forever)
+        else:
+            await bot.remove_webhook()
+            print("[Bot] Starting polling on asyncio (deployment mode)…")
+            await bot.infinity_polling()
+    finally:
+        await bot.close_session()
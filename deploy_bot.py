@@ -1,73 +1,138 @@
-import yaml, uuid, importlib.util
+import argparse, importlib.util, secrets
 from pathlib import Path
 import telebot
+from menu import MODULES_PATH, MenuLoader
+from media_cache import MediaCache
+from media_pipeline import Derivatives
+from dispatcher import dispatch
+from navigation import show_screen
+from outbound import OutboundScheduler, install, use_api_server
+from bundle import BundleLoader
+from graph import check_nodes
+from sessions import navigate, open_sessions
+from subscribers import SUBSCRIBERS_PATH, ChatLog
+import metrics
 
-MODULES_PATH = Path("root-menu")
 CONFIG_PY = Path("config.py")
 
-# Load API key
-if not CONFIG_PY.exists():
-    raise RuntimeError("config.py with BOT_TOKEN not found. Run main.py first and set your API Key.")
-spec = importlib.util.spec_from_file_location("config", CONFIG_PY)
-cfg = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(cfg)
-BOT_TOKEN = getattr(cfg, "BOT_TOKEN", None)
-if not BOT_TOKEN:
-    raise RuntimeError("BOT_TOKEN is missing in config.py")
 
-bot = telebot.TeleBot(BOT_TOKEN, parse_mode="Markdown")
-callback_map = {}
+def load_token():
+    if not CONFIG_PY.exists():
+        raise RuntimeError("config.py with BOT_TOKEN not found. Run main.py first and set your API Key.")
+    spec = importlib.util.spec_from_file_location("config", CONFIG_PY)
+    cfg = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(cfg)
+    token = getattr(cfg, "BOT_TOKEN", None)
+    if not token:
+        raise RuntimeError("BOT_TOKEN is missing in config.py")
+    return token
 
-def build_keyboard(path=""):
-    m = telebot.types.InlineKeyboardMarkup()
-    folder = MODULES_PATH / path
-    for child in folder.iterdir():
-        if child.is_dir():
-            info = yaml.safe_load(open(child / "info.yaml"))
-            lbl, cb = info.get("label", child.name), str(uuid.uuid4())[:8]
-            m.add(telebot.types.InlineKeyboardButton(lbl, callback_data=cb))
-            callback_map[cb] = str(child.relative_to(MODULES_PATH))
-    if path:
-        m.add(telebot.types.InlineKeyboardButton("⬅️ Back", callback_data="BACK"))
-    return m
 
-# Load main text
-main_text = "🚀 Welcome!"
-main_menu_file = MODULES_PATH / "main_menu.txt"
-if main_menu_file.exists():
-    main_text = main_menu_file.read_text().strip()
+def build_bot(token, menu_loader, media_cache, sessions, subscribers, workers):
+    """A TeleBot serving the menu, with its updates handled on a pool of ``workers`` threads."""
+    bot = telebot.TeleBot(token, parse_mode="Markdown", threaded=False)
+    dispatch(bot, workers=workers)
 
-@bot.message_handler(commands=["start"])
-def start(m):
-    bot.send_message(m.chat.id, main_text, reply_markup=build_keyboard())
+    @bot.message_handler(commands=["start"])
+    def start(m):
+        menu = menu_loader.menu
+        subscribers.add(m.chat.id)
+        sessions.delete(m.chat.id)
+        bot.send_message(m.chat.id, menu.nodes[""].description, reply_markup=menu.keyboards[""])
 
-@bot.callback_query_handler(func=lambda c: True)
-def cb(call):
-    path = callback_map.get(call.data, "")
-    folder = None
-    desc, media = "", None
+    @bot.callback_query_handler(func=lambda c: True)
+    def cb(call):
+        menu = menu_loader.menu
+        path, desc, media = navigate(menu, sessions, call.message.chat.id, call.data)
+        show_screen(bot, media_cache, call.message, desc, media, menu.keyboards[path])
 
-    if call.data == "BACK":
-        path = ""
-        desc = main_text
+    return bot
+
+
+def run_threaded(token, menu_loader, media_cache, sessions, subscribers, workers, webhook=None):
+    bot = build_bot(token, menu_loader, media_cache, sessions, subscribers, workers)
+    if webhook:
+        from webhook import WebhookServer
+        server = WebhookServer((webhook.listen, webhook.port), webhook.secret, bot.process_new_updates)
+        bot.set_webhook(url=webhook.url, secret_token=webhook.secret)
+        print(f"[Bot] Receiving webhook updates on {webhook.listen}:{webhook.port} (deployment mode)…")
+        server.serve_forever()
     else:
-        folder = MODULES_PATH / path if path else None
-        if folder and (folder / "info.yaml").exists():
-            info = yaml.safe_load(open(folder / "info.yaml"))
-            desc, media = info.get("description", ""), info.get("media", "")
-        if not desc.strip():
-            desc = main_text
+        bot.remove_webhook()
+        print("[Bot] Starting polling (deployment mode)…")
+        bot.infinity_polling()
+
 
-    try:
-        bot.delete_message(call.message.chat.id, call.message.message_id)
-    except:
-        pass
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the bot defined in root-menu/ without the editor.")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="threads handling updates; updates from one chat are always handled in order")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="worker processes serving the bot; one receiver fetches updates and spreads chats over them")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="serve all chats from one asyncio event loop instead of a thread pool")
+    parser.add_argument("--connections", type=int, default=100,
+                        help="with --async: size of the keep-alive HTTP connection pool to the Bot API")
+    parser.add_argument("--bundle", metavar="FILE",
+                        help="serve a menu compiled with 'python3 bundle.py compile' instead of root-menu/")
+    parser.add_argument("--rate", type=float, default=30,
+                        help="messages per second the bot may send in total (Telegram allows about 30)")
+    parser.add_argument("--chat-rate", type=float, default=1,
+                        help="messages per second the bot may send to one private chat (Telegram allows about 1)")
+    parser.add_argument("--api-server", metavar="URL",
+                        help="Bot API server to talk to instead of https://api.telegram.org, e.g. a local "
+                             "telegram-bot-api or benchmark.py's fake server")
+    parser.add_argument("--sessions", metavar="URL",
+                        help="where to keep each chat's navigation history: memory (default), "
+                             "sqlite:///FILE or redis://HOST:PORT/DB to share it between bot processes")
+    parser.add_argument("--metrics", metavar="[HOST:]PORT",
+                        help="serve Prometheus metrics on http://HOST:PORT/metrics (with --processes, "
+                             "worker N uses PORT+N)")
+    parser.add_argument("--log-json", action="store_true",
+                        help="log every update and Bot API call timing as a JSON line on stderr")
+    parser.add_argument("--webhook", dest="url", metavar="URL",
+                        help="receive updates on this public https URL instead of long polling")
+    parser.add_argument("--listen", default="127.0.0.1", help="with --webhook: address to bind the HTTP server to")
+    parser.add_argument("--port", type=int, default=8080, help="with --webhook: port to bind the HTTP server to")
+    parser.add_argument("--secret", default=secrets.token_urlsafe(32),
+                        help="with --webhook: secret token Telegram must send (random by default)")
+    args = parser.parse_args()
+    webhook = args if args.url else None
+    if args.processes > 1 and args.use_async:
+        parser.error("--processes runs threaded workers and cannot be combined with --async")
 
-    if media and Path(media).exists():
-        with open(media, "rb") as f:
-            bot.send_photo(call.message.chat.id, f, caption=desc, reply_markup=build_keyboard(path))
+    if args.use_async:
+        # Before use_api_server/install, which patch the asyncio client only once it is loaded
+        import asyncio
+        from deploy_async import run_async
+    token = load_token()
+    if args.log_json:
+        metrics.enable_logs()
+    if args.api_server:
+        use_api_server(args.api_server)
+    if args.processes > 1:
+        from shard import run_sharded
+        run_sharded(token, args, webhook)
     else:
-        bot.send_message(call.message.chat.id, desc, reply_markup=build_keyboard(path))
+        if args.metrics:
+            metrics.serve(args.metrics)
+        install(OutboundScheduler(rate=args.rate, chat_rate=args.chat_rate))
+        # Parse root-menu/ (or the compiled bundle) once; every update is served from this
+        # in-memory tree and its prebuilt keyboards, whose callback_data stays valid across restarts.
+        # Changes on disk are picked up in the background and swapped in atomically.
+        menu_loader = BundleLoader(args.bundle) if args.bundle else MenuLoader(MODULES_PATH)
+        menu_loader.reload()
+        if not args.bundle:
+            # Checking a bundle would decode every record; graph.py compile checks it instead
+            for problem in check_nodes(menu_loader.menu.nodes):
+                print(f"[Bot] Warning: {problem}")
+        menu_loader.watch()
+        media_cache = MediaCache(derivatives=Derivatives())
+        sessions = open_sessions(args.sessions)
+        # Every chat that pressed /start, for broadcast.py
+        subscribers = ChatLog(SUBSCRIBERS_PATH)
 
-print("[Bot] Starting polling (deployment mode)…")
-bot.infinity_polling()
+        if args.use_async:
+            asyncio.run(run_async(token, menu_loader, media_cache, sessions, subscribers, args.connections, webhook))
+        else:
+            run_threaded(token, menu_loader, media_cache, sessions, subscribers, args.workers, webhook)
@@ -0,0 +1,111 @@
+import threading, traceback, asyncio, contextlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from metrics import UPDATES, UPDATE_SECONDS
+
+UPDATE_KINDS = ("message", "callback_query", "edited_message", "channel_post", "edited_channel_post",
+                "inline_query", "chosen_inline_result", "my_chat_member", "chat_member")
+
+
+def chat_key(update):
+    """The chat an update belongs to; updates sharing a key are handled strictly in order."""
+    for msg in (update.message, update.edited_message, update.channel_post, update.edited_channel_post):
+        if msg is not None:
+            return msg.chat.id
+    if update.callback_query is not None:
+        call = update.callback_query
+        return call.message.chat.id if call.message is not None else call.from_user.id
+    for event in (update.inline_query, update.chosen_inline_result, update.shipping_query,
+                  update.pre_checkout_query, update.my_chat_member, update.chat_member):
+        if event is not None:
+            chat = getattr(event, "chat", None)
+            return chat.id if chat is not None else event.from_user.id
+    return ("update", update.update_id)  # unrelated to any chat, no ordering needed
+
+
+def update_kind(update):
+    return next((kind for kind in UPDATE_KINDS if getattr(update, kind, None) is not None), "other")
+
+
+class ChatDispatcher:
+    """Runs updates on a thread pool while keeping each chat's updates in arrival order.
+
+    A chat has at most one update in flight; later ones wait in that chat's backlog, so a
+    slow chat never holds up a worker that other chats could use. ``max_pending`` bounds
+    the total backlog: ``submit`` blocks once it is reached.
+    """
+
+    def __init__(self, handle, workers=8, max_pending=1000):
+        self.handle = handle
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="dispatch")
+        self.slots = threading.Semaphore(max_pending)
+        self.lock = threading.Lock()
+        self.backlog = {}  # chat key -> deque of updates queued behind the one in flight
+
+    def submit(self, update):
+        self.slots.acquire()
+        UPDATES.inc(kind=update_kind(update))
+        key = chat_key(update)
+        with self.lock:
+            if key in self.backlog:
+                self.backlog[key].append(update)
+                return
+            self.backlog[key] = deque()
+        self.executor.submit(self._run, key, update)
+
+    def _run(self, key, update):
+        while True:
+            try:
+                with UPDATE_SECONDS.time(kind=update_kind(update)):
+                    self.handle(update)
+            except Exception as e:
+                print(f"[Bot] Failed to handle update {update.update_id}: {e}")
+                traceback.print_exc()
+            finally:
+                self.slots.release()
+            with self.lock:
+                if not self.backlog[key]:
+                    del self.backlog[key]
+                    return
+                update = self.backlog[key].popleft()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class ChatLocks:
+    """asyncio counterpart of ChatDispatcher: handlers of one chat run one at a time, in arrival order."""
+
+    def __init__(self):
+        self.locks = {}  # chat key -> [lock, number of handlers holding or waiting for it]
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        entry = self.locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+
+def dispatch(bot, workers=8, max_pending=1000):
+    """Route ``bot``'s incoming updates through a ChatDispatcher.
+
+    The bot must be created with ``threaded=False`` so handlers only run on the dispatcher's pool.
+    """
+    process = bot.process_new_updates
+    dispatcher = ChatDispatcher(lambda update: process([update]), workers, max_pending)
+
+    def submit(updates):
+        for update in updates:
+            # Advance the polling offset here: workers may finish out of order
+            if update.update_id > bot.last_update_id:
+                bot.last_update_id = update.update_id
+            dispatcher.submit(update)
+
+    bot.process_new_updates = submit
+    return dispatcher
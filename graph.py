@@ -0,0 +1,491 @@
+import os, json, argparse
+from collections import deque
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from menu import MODULES_PATH, DEFAULT_MAIN_TEXT, MenuNode, compile_menu, read_info
+
+# The menu as the editor sees it: boxes joined by links, laid out on disk as nested folders.
+# Nothing here imports Qt, so the command line tools and CI can work on a project without a scene.
+
+BOX_WIDTH, BOX_HEIGHT = 200, 150  # a box's size in the editor (height grows with its text)
+CAPTION_LIMIT, MESSAGE_LIMIT = 1024, 4096  # Telegram's limits for a photo caption and a text message
+INFO_FIELDS = ("label", "description", "media", "children", "buttons_per_row")
+
+
+class Box:
+    """A box outside the editor; has the same attributes as the editor's RoundedBoxItem."""
+
+    __slots__ = ("folder_name", "button_name", "description", "media", "buttons_per_row", "x", "y")
+
+    def __init__(self, folder_name, button_name="", description="", media="", buttons_per_row=1, x=50.0, y=50.0):
+        self.folder_name, self.button_name, self.description, self.media = folder_name, button_name, description, media
+        self.buttons_per_row, self.x, self.y = buttons_per_row, x, y
+
+
+class Link:
+    __slots__ = ("start_box", "end_box")
+
+    def __init__(self, start_box, end_box):
+        self.start_box, self.end_box = start_box, end_box
+
+
+class MenuGraph:
+    """Boxes and links between them, with the indexes needed to edit large menus quickly.
+
+    Boxes are kept in a list with each box's position in ``box_index``, so removal can swap in the
+    last box instead of shifting the list. ``outgoing``/``incoming`` map a box to {link: None} in
+    insertion order. A link is anything with ``start_box`` and ``end_box``: Link here, the
+    editor's arrows there.
+    """
+
+    def __init__(self, main_text=DEFAULT_MAIN_TEXT, buttons_per_row=1):
+        self.main_text, self.buttons_per_row = main_text, buttons_per_row  # of the main menu
+        self.boxes, self.links = [], {}
+        self.box_index, self.outgoing, self.incoming = {}, {}, {}
+
+    def add_box(self, box):
+        self.box_index[box] = len(self.boxes)
+        self.boxes.append(box)
+        self.outgoing[box], self.incoming[box] = {}, {}
+        return box
+
+    def remove_box(self, box):
+        """Remove ``box`` with its links and return the links removed."""
+        links = self.links_of(box)
+        for link in links:
+            self.remove_link(link)
+        del self.outgoing[box], self.incoming[box]
+        idx, last = self.box_index.pop(box), self.boxes.pop()
+        if last is not box:
+            self.boxes[idx] = last
+            self.box_index[last] = idx
+        return links
+
+    def add_link(self, link):
+        self.links[link] = None
+        self.outgoing[link.start_box][link] = None
+        self.incoming[link.end_box][link] = None
+        return link
+
+    def remove_link(self, link):
+        del self.links[link]
+        del self.outgoing[link.start_box][link]
+        del self.incoming[link.end_box][link]
+
+    def links_of(self, box):
+        return [*self.outgoing.get(box, ()), *self.incoming.get(box, ())]
+
+    def children(self, box):
+        return [link.end_box for link in self.outgoing[box]]
+
+    def roots(self):
+        return [box for box in self.boxes if not self.incoming[box]]
+
+    def subgraph(self, boxes):
+        """A MenuGraph of just ``boxes`` and the links between them (the same objects, not copies)."""
+        sub = MenuGraph(self.main_text, self.buttons_per_row)
+        for box in boxes:
+            sub.add_box(box)
+        for link in self.links:
+            if link.start_box in sub.box_index and link.end_box in sub.box_index:
+                sub.add_link(link)
+        return sub
+
+
+def box_info(box, children_paths, x, y):
+    """The info.yaml content for ``box``."""
+    info = {
+        "label": box.button_name,
+        "description": box.description,
+        "media": box.media,
+        "children": children_paths,
+        "x": float(x),
+        "y": float(y)
+    }
+    if box.buttons_per_row != 1:
+        info["buttons_per_row"] = box.buttons_per_row
+    return info
+
+
+def layout(graph, info=None):
+    """Lay the graph out as folders: roots at the top, each box under every box linking to it.
+
+    Links back to an ancestor are left out. ``info(box, children_paths)`` makes a box's info.yaml
+    content (by default from its x and y). Returns ({folder relative to root-menu/: info},
+    {box: its first folder}).
+    """
+    if info is None:
+        info = lambda box, children_paths: box_info(box, children_paths, box.x, box.y)
+    infos, locations, ancestors = {}, {}, set()
+
+    def place(box, rel):
+        ancestors.add(box)
+        children = [c for c in graph.children(box) if c not in ancestors]  # skip link cycles
+        children_paths = [f"{rel}/{c.folder_name}" for c in children]
+        infos[rel] = info(box, children_paths)
+        locations.setdefault(box, rel)
+        for child, child_rel in zip(children, children_paths):
+            place(child, child_rel)
+        ancestors.discard(box)
+
+    for root in graph.roots():
+        place(root, root.folder_name)
+    return infos, locations
+
+
+def auto_layout(graph, heights=None, gap_x=40, gap_y=80, iterations=50):
+    """Scene positions {box: (x, y)} for a readable picture of the whole graph. Needs NumPy.
+
+    Boxes are placed in rows by their depth in a breadth-first spanning tree, subtrees side by
+    side and each parent centred over its children. When there are links outside that tree, a few
+    rounds of springs along every link pull linked boxes together, while the boxes in a row keep
+    at least a box width apart. ``heights`` lists the boxes' heights in ``graph.boxes`` order.
+    """
+    import numpy as np
+
+    n = len(graph.boxes)
+    if not n:
+        return {}
+    index = graph.box_index
+    parent, depth = np.full(n, -1), np.zeros(n, dtype=np.int64)
+    tree_children, tree_roots, seen = [[] for _ in range(n)], [], bytearray(n)
+    # Boxes only reachable through a cycle start trees of their own
+    for start in [index[box] for box in graph.roots()] + list(range(n)):
+        if seen[start]:
+            continue
+        seen[start] = 1
+        tree_roots.append(start)
+        todo = deque([start])
+        while todo:
+            i = todo.popleft()
+            for link in graph.outgoing[graph.boxes[i]]:
+                c = index[link.end_box]
+                if not seen[c]:
+                    seen[c], parent[c], depth[c] = 1, i, depth[i] + 1
+                    tree_children[i].append(c)
+                    todo.append(c)
+
+    # Leaves take consecutive columns in depth-first order; a parent spans its first to last leaf
+    lo, hi, column, stack = np.full(n, np.inf), np.full(n, -np.inf), 0, tree_roots[::-1]
+    while stack:
+        i = stack.pop()
+        if tree_children[i]:
+            stack.extend(reversed(tree_children[i]))
+        else:
+            lo[i] = hi[i] = column
+            column += 1
+    for d in range(int(depth.max()), 0, -1):
+        row = np.flatnonzero(depth == d)
+        np.minimum.at(lo, parent[row], lo[row])
+        np.maximum.at(hi, parent[row], hi[row])
+    spacing = BOX_WIDTH + gap_x
+    x = (lo + hi) / 2 * spacing
+
+    h = np.full(n, float(BOX_HEIGHT)) if heights is None else np.asarray(heights, dtype=float)
+    row_height = np.zeros(int(depth.max()) + 1)
+    np.maximum.at(row_height, depth, h)
+    row_y = np.concatenate(([0.0], np.cumsum(row_height + gap_y)[:-1]))
+    y = row_y[depth]
+
+    edges = np.array([(index[l.start_box], index[l.end_box]) for l in graph.links], dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    if len(edges) > n - len(tree_roots):  # some links are not tree edges
+        src, dst = edges[:, 0], edges[:, 1]
+        degree = np.bincount(edges.ravel(), minlength=n).clip(1)
+        for _ in range(iterations):
+            pull = np.bincount(src, x[dst] - x[src], n) + np.bincount(dst, x[src] - x[dst], n)
+            x = x + 0.5 * pull / degree
+            # Keep each row's order and spacing: shift boxes right until they are a box width apart,
+            # a running maximum per row done in one pass by lifting every row above the previous one
+            order = np.lexsort((x, depth))
+            rows = depth[order]
+            rank = np.arange(n) - np.searchsorted(rows, rows)
+            packed = x[order] - rank * spacing
+            lift = 2 * (np.abs(packed).max() + 1)
+            packed = np.maximum.accumulate(packed + rows * lift) - rows * lift
+            x[order] = packed + rank * spacing
+    x -= x.min()
+    return {box: (float(x[i]), float(y[i])) for i, box in enumerate(graph.boxes)}
+
+
+def write_info(folder, info):
+    import yaml
+    # Temp file + rename: an interrupted save never leaves a truncated info.yaml behind
+    folder.mkdir(parents=True, exist_ok=True)
+    tmp = folder / "info.yaml.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        yaml.safe_dump(info, f)
+    os.replace(tmp, folder / "info.yaml")
+
+
+def write_layout(root, infos, saved):
+    """Bring ``root`` in line with ``infos``, given ``saved``, the infos it holds now.
+
+    Only info.yaml files that differ are written, and stale folders are removed afterwards, so
+    the menu is never left half-deleted. ``saved`` is updated to match.
+    """
+    root = Path(root)
+    root.mkdir(exist_ok=True)
+    for rel, info in infos.items():
+        if saved.get(rel) != info:
+            write_info(root / rel, info)
+            saved[rel] = info
+    stale = sorted(saved.keys() - infos.keys(), key=lambda rel: rel.count("/"), reverse=True)
+    for rel in stale:
+        (root / rel / "info.yaml").unlink(missing_ok=True)
+        del saved[rel]
+    for rel in stale:
+        try:
+            (root / rel).rmdir()
+        except OSError:
+            pass  # still holds other boxes or files that aren't ours
+
+
+def info_paths(root=MODULES_PATH):
+    """Every box's info.yaml under ``root`` (the main menu's own is not a box)."""
+    return [p for p in Path(root).rglob("info.yaml") if p.parent != Path(root)]
+
+
+def read_infos(root=MODULES_PATH, paths=None):
+    """Parse every box's info.yaml under ``root`` (or just ``paths``) on a thread pool.
+
+    Yields (info.yaml path, info) as each file is done; info is the exception for unreadable files.
+    """
+    paths = info_paths(root) if paths is None else paths
+
+    def parse(info_path):
+        try:
+            return info_path, read_info(info_path)
+        except Exception as e:
+            return info_path, e
+
+    with ThreadPoolExecutor() as pool:
+        for future in as_completed([pool.submit(parse, p) for p in paths]):
+            yield future.result()
+
+
+def box_from_info(folder_name, info):
+    return Box(folder_name, info.get("label", ""), info.get("description", ""), info.get("media", ""),
+               info.get("buttons_per_row", 1), info.get("x", 50), info.get("y", 50))
+
+
+def load_graph(root=MODULES_PATH):
+    """Read a project folder into a MenuGraph; returns it with the infos read, keyed by folder.
+
+    Like the bot, each box links to the boxes in its subfolders; ``children:`` lists in info.yaml
+    are not trusted, as hand-written and older projects leave them out or stale.
+    """
+    root = Path(root)
+    main_menu_file, root_info = root / "main_menu.txt", root / "info.yaml"
+    main_text = main_menu_file.read_text(encoding="utf-8").strip() if main_menu_file.exists() else DEFAULT_MAIN_TEXT
+    graph = MenuGraph(main_text, (read_info(root_info) if root_info.exists() else {}).get("buttons_per_row", 1))
+    boxes, saved = {}, {}
+    for info_path, info in sorted(read_infos(root), key=lambda item: item[0].parent.parts):
+        if isinstance(info, Exception):
+            print(f"Skipping {info_path}: {info}")
+            continue
+        rel = info_path.parent.relative_to(root).as_posix()
+        parent = rel.rpartition("/")[0]  # sorted by path, so parents come first
+        if parent and parent not in boxes:
+            continue  # below a folder that is not a box: the bot never gets there either
+        boxes[rel] = graph.add_box(box_from_info(info_path.parent.name, info))
+        saved[rel] = info
+        if parent:
+            graph.add_link(Link(boxes[parent], boxes[rel]))
+    return graph, saved
+
+
+def save_graph(graph, root=MODULES_PATH, saved=None):
+    """Write ``graph`` into ``root``, replacing what is there; returns {box: its folder}."""
+    root = Path(root)
+    if saved is None:
+        saved = {p.parent.relative_to(root).as_posix(): info
+                 for p, info in read_infos(root) if not isinstance(info, Exception)}
+    infos, locations = layout(graph)
+    write_layout(root, infos, saved)
+    root_info = read_info(root / "info.yaml") if (root / "info.yaml").exists() else {}
+    if root_info.get("buttons_per_row", 1) != graph.buttons_per_row:
+        write_info(root, {**root_info, "buttons_per_row": graph.buttons_per_row})
+    main_menu_file = root / "main_menu.txt"
+    current = main_menu_file.read_text(encoding="utf-8").strip() if main_menu_file.exists() else DEFAULT_MAIN_TEXT
+    if graph.main_text != current:
+        main_menu_file.write_text(graph.main_text + "\n", encoding="utf-8")
+    return locations
+
+
+def to_nodes(graph, infos=None):
+    """The {node id: MenuNode} map the bot would serve once ``graph`` is saved, without touching disk."""
+    if infos is None:
+        infos = layout(graph)[0]
+    # The bot lists a node's children in folder order, one button per subfolder holding an info.yaml
+    children = {"": []}
+    for rel in infos:
+        parent, _, _ = rel.rpartition("/")
+        children.setdefault(parent, []).append(rel)
+        children.setdefault(rel, [])
+    order = lambda rel: tuple(sorted(children[rel], key=lambda child: child.rsplit("/", 1)[-1]))
+    nodes = {"": MenuNode("", "", graph.main_text, "", order(""), max(1, int(graph.buttons_per_row or 1)))}
+    for rel, info in infos.items():
+        nodes[rel] = MenuNode(
+            rel, str(info.get("label") or ""), str(info.get("description") or ""), str(info.get("media") or ""),
+            order(rel), max(1, int(info.get("buttons_per_row", 1) or 1))
+        )
+    return nodes
+
+
+def check_nodes(nodes):
+    """Problems the bot would run into serving ``nodes``, as readable lines."""
+    problems = []
+    for node_id, node in nodes.items():
+        if not node_id:
+            continue
+        if not node.label.strip():
+            problems.append(f"{node_id}: empty button label")
+        has_media = bool(node.media) and Path(node.media).is_file()
+        if node.media and not has_media:
+            problems.append(f"{node_id}: media file {node.media} not found; the screen is sent as text")
+        limit = CAPTION_LIMIT if has_media else MESSAGE_LIMIT
+        if len(node.description) > limit:
+            problems.append(f"{node_id}: description is {len(node.description)} characters, Telegram allows {limit}")
+    return problems
+
+
+def validate(graph):
+    """Problems with ``graph`` as readable lines: what saving would lose and what the bot would trip on."""
+    problems = []
+    for box in graph.boxes:
+        name = box.folder_name
+        if not name.strip() or name in (".", "..") or "/" in name or "\\" in name or name != name.strip():
+            problems.append(f"{name!r}: not a usable folder name")
+
+    def check_siblings(parent, boxes):
+        seen = set()
+        for box in boxes:
+            if box.folder_name in seen:
+                problems.append(f"{parent}: more than one box in folder {box.folder_name!r}; only the last one is saved")
+            seen.add(box.folder_name)
+
+    check_siblings("main menu", graph.roots())
+    for box in graph.boxes:
+        check_siblings(box.folder_name, set(graph.children(box)))
+
+    # Colour the graph depth-first: a link into a box still on the stack closes a cycle
+    state, reached = {}, set()
+    for root in graph.roots():
+        stack = [(root, iter(graph.children(root)))]
+        state[root] = "open"
+        while stack:
+            box, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                state[box] = "done"
+                reached.add(box)
+                stack.pop()
+            elif state.get(child) == "open":
+                problems.append(f"link {box.folder_name} -> {child.folder_name} closes a cycle and is not saved")
+            elif child not in state:
+                state[child] = "open"
+                stack.append((child, iter(graph.children(child))))
+    unreached = [box.folder_name for box in graph.boxes if box not in reached]
+    if unreached:
+        problems.append(f"{len(unreached)} boxes are only reachable through a cycle and are not saved: "
+                        + ", ".join(sorted(unreached)[:10]))
+    return problems + check_nodes(to_nodes(graph))
+
+
+def diff(old, new, positions=False):
+    """Lines describing how the saved form of graph ``new`` differs from ``old``."""
+    fields = INFO_FIELDS + (("x", "y") if positions else ())
+    old_infos, new_infos = layout(old)[0], layout(new)[0]
+    lines = [f"+ {rel}" for rel in new_infos if rel not in old_infos]
+    lines += [f"- {rel}" for rel in old_infos if rel not in new_infos]
+    for rel in new_infos.keys() & old_infos.keys():
+        for field in fields:
+            before, after = old_infos[rel].get(field), new_infos[rel].get(field)
+            if before != after:
+                lines.append(f"~ {rel}: {field} {before!r} -> {after!r}")
+    if old.main_text != new.main_text:
+        lines.append(f"~ main menu: text {old.main_text!r} -> {new.main_text!r}")
+    if old.buttons_per_row != new.buttons_per_row:
+        lines.append(f"~ main menu: buttons_per_row {old.buttons_per_row} -> {new.buttons_per_row}")
+    return sorted(lines, key=lambda line: line[2:])
+
+
+def export_graph(graph):
+    """The whole graph as JSON-ready data; links refer to boxes by position."""
+    return {
+        "main_text": graph.main_text,
+        "buttons_per_row": graph.buttons_per_row,
+        "boxes": [{"folder": b.folder_name, "label": b.button_name, "description": b.description, "media": b.media,
+                   "buttons_per_row": b.buttons_per_row, "x": b.x, "y": b.y} for b in graph.boxes],
+        "links": [[graph.box_index[l.start_box], graph.box_index[l.end_box]] for l in graph.links]
+    }
+
+
+def import_graph(data):
+    graph = MenuGraph(data.get("main_text", DEFAULT_MAIN_TEXT), data.get("buttons_per_row", 1))
+    boxes = [graph.add_box(Box(b["folder"], b.get("label", ""), b.get("description", ""), b.get("media", ""),
+                               b.get("buttons_per_row", 1), b.get("x", 50.0), b.get("y", 50.0)))
+             for b in data["boxes"]]
+    for start, end in data.get("links", []):
+        graph.add_link(Link(boxes[start], boxes[end]))
+    return graph
+
+
+def open_graph(source):
+    """A MenuGraph from a project folder or an exported .json file."""
+    if str(source).endswith(".json"):
+        return import_graph(json.loads(Path(source).read_text(encoding="utf-8")))
+    return load_graph(source)[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check, compare, compile and convert menus without the editor. "
+                                                 "SOURCE is a project folder or an exported .json file.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("validate", help="list problems; exits with status 1 if there are any")
+    check.add_argument("source", nargs="?", default=str(MODULES_PATH), metavar="SOURCE")
+    build = sub.add_parser("compile", help="write a bundle for deploy_bot.py --bundle")
+    build.add_argument("source", nargs="?", default=str(MODULES_PATH), metavar="SOURCE")
+    build.add_argument("-o", "--output", default="menu.bundle", help="bundle file to write (default: menu.bundle)")
+    build.add_argument("--media-hashes", action="store_true", help="record a sha256 of every media file")
+    compare = sub.add_parser("diff", help="show what changes between two menus")
+    compare.add_argument("old", metavar="OLD")
+    compare.add_argument("new", nargs="?", default=str(MODULES_PATH), metavar="NEW")
+    compare.add_argument("--positions", action="store_true", help="also report boxes that were moved")
+    export = sub.add_parser("export", help="write a project as one JSON file")
+    export.add_argument("source", nargs="?", default=str(MODULES_PATH), metavar="SOURCE")
+    export.add_argument("-o", "--output", default="menu.json", help="file to write (default: menu.json)")
+    load = sub.add_parser("import", help="replace a project folder with the menu in a JSON file")
+    load.add_argument("file", metavar="FILE")
+    load.add_argument("root", nargs="?", default=str(MODULES_PATH), help="project folder (default: root-menu)")
+    args = parser.parse_args()
+
+    if args.command == "validate":
+        problems = validate(open_graph(args.source))
+        for problem in problems:
+            print(problem)
+        print(f"{len(problems)} problems")
+        raise SystemExit(1 if problems else 0)
+    elif args.command == "compile":
+        from bundle import compile_bundle, write_bundle
+        if args.source.endswith(".json"):
+            # As the bot would load the folders importing it writes
+            menu = compile_menu(to_nodes(open_graph(args.source)))
+            write_bundle(menu, args.output, args.media_hashes)
+        else:
+            menu = compile_bundle(args.source, args.output, args.media_hashes)  # same as bundle.py compile
+        for problem in check_nodes(menu.nodes):
+            print(f"Warning: {problem}")
+        print(f"Compiled {len(menu.nodes)} nodes into {args.output}")
+    elif args.command == "diff":
+        for line in diff(open_graph(args.old), open_graph(args.new), args.positions):
+            print(line)
+    elif args.command == "export":
+        graph = open_graph(args.source)
+        Path(args.output).write_text(json.dumps(export_graph(graph), ensure_ascii=False, indent=1), encoding="utf-8")
+        print(f"Exported {len(graph.boxes)} boxes and {len(graph.links)} links to {args.output}")
+    else:
+        graph = open_graph(args.file)
+        save_graph(graph, args.root)
+        print(f"Imported {len(graph.boxes)} boxes into {args.root}")
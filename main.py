@@ -1,13 +1,26 @@
-import sys, os, yaml, uuid, shutil, threading, importlib.util
+import sys, time, uuid, queue, threading, importlib.util
+from collections import deque
 from pathlib import Path
 from PyQt6.QtWidgets import *
 from PyQt6.QtGui import *
 from PyQt6.QtCore import *
-import telebot
+from menu import MODULES_PATH, load_menu, read_info
+from graph import MenuGraph, box_info, layout, write_info, write_layout, info_paths, read_infos, auto_layout
+from media_pipeline import Derivatives, optimize, pool
+from search import SearchIndex
 
-MODULES_PATH = Path("root-menu")
 MODULES_PATH.mkdir(exist_ok=True)
 CONFIG_PY = Path("config.py")
+UNDO_DEPTH = 200  # undo steps kept; older ones are dropped
+LOAD_BATCH = 200  # boxes added to the scene per event-loop turn while a project loads
+LOAD_INTERVAL_MS = 15  # between those turns; a 0 ms timer would spin while the parser threads work
+LOD_DETAIL = 0.5  # zoom level below which boxes are drawn as plain shapes and the grid is hidden
+SEARCH_HITS = 50  # boxes Enter cycles through for one search
+LAYOUT_ANIMATION_MS = 400  # how long boxes take to glide into place after Auto Layout
+
+
+def level_of_detail(painter):
+    return QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
 
 
 class ArrowItem(QGraphicsLineItem):
@@ -24,6 +37,13 @@ class ArrowItem(QGraphicsLineItem):
         self.setLine(QLineF(p1c, p2c))
 
 
+class BoxText(QGraphicsTextItem):
+    def paint(self, painter, option, widget=None):
+        # Text is unreadable when zoomed far out and is the most expensive part of a box to draw
+        if level_of_detail(painter) >= LOD_DETAIL:
+            super().paint(painter, option, widget)
+
+
 class LinkHandle(QGraphicsEllipseItem):
     def __init__(self, parent_box):
         super().__init__(-5, -5, 10, 10, parent_box)
@@ -50,10 +70,13 @@ class RoundedBoxItem(QGraphicsRectItem):
 
         self.setBrush(QBrush(QColor("#cde")))
         self.buttons_per_row = 1  # default
-        self.text = QGraphicsTextItem(self.format_text(), self)
+        self.text = BoxText(self.format_text(), self)
         self.text.setDefaultTextColor(Qt.GlobalColor.black)
         self.text.setPos(10, 10)
         self.link_handle = LinkHandle(self)
+        # Re-render only when the box itself or the zoom changes, not on every scroll/repaint
+        self.setCacheMode(QGraphicsItem.CacheMode.DeviceCoordinateCache)
+        self.text.setCacheMode(QGraphicsItem.CacheMode.DeviceCoordinateCache)
         self.adjust_size()
         self.setPos(x, y)
     def itemChange(self, change, value):
@@ -63,8 +86,21 @@ class RoundedBoxItem(QGraphicsRectItem):
             x = round(new_pos.x() / grid_size) * grid_size
             y = round(new_pos.y() / grid_size) * grid_size
             return QPointF(x, y)
+        if change == QGraphicsItem.GraphicsItemChange.ItemPositionHasChanged:
+            self.update_links()
         return super().itemChange(change, value)
 
+    def paint(self, painter, option, widget=None):
+        if level_of_detail(painter) < LOD_DETAIL:
+            painter.fillRect(self.rect(), self.brush())
+        else:
+            super().paint(painter, option, widget)
+
+    def update_links(self):
+        # Arrows follow their boxes; only the edges touching this box need to move
+        for link in self.main_win.links_of(self):
+            link.update_position()
+
     def format_text(self):
         parts = [
             f"Folder: {self.folder_name}",
@@ -84,6 +120,7 @@ class RoundedBoxItem(QGraphicsRectItem):
         self.text.setPlainText(text)
         self.text.setTextWidth(200 - 20)
         self.link_handle.setPos(self.rect().bottomRight() - QPointF(10, 10))
+        self.update_links()
 
     def update_text(self):
         self.text.setPlainText(self.format_text())
@@ -98,19 +135,117 @@ class GridScene(QGraphicsScene):
     def __init__(self, grid_size=10, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.grid_size = grid_size
+        # Render one tile of grid lines once; Qt repeats the tile instead of drawing every line
+        tile = QPixmap(grid_size * 10, grid_size * 10)
+        tile.fill(Qt.GlobalColor.white)
+        painter = QPainter(tile)
+        painter.setPen(QPen(QColor(230, 230, 230), 0))
+        for i in range(0, tile.width(), grid_size):
+            painter.drawLine(i, 0, i, tile.height())
+            painter.drawLine(0, i, tile.width(), i)
+        painter.end()
+        self.grid_brush = QBrush(tile)
 
     def drawBackground(self, painter, rect):
-        left = int(rect.left()) - (int(rect.left()) % self.grid_size)
-        top = int(rect.top()) - (int(rect.top()) % self.grid_size)
+        if level_of_detail(painter) < LOD_DETAIL:
+            painter.fillRect(rect, Qt.GlobalColor.white)
+        else:
+            painter.fillRect(rect, self.grid_brush)
 
-        lines = []
-        for x in range(left, int(rect.right()) + self.grid_size, self.grid_size):
-            lines.append(QLineF(x, rect.top(), x, rect.bottom()))
-        for y in range(top, int(rect.bottom()) + self.grid_size, self.grid_size):
-            lines.append(QLineF(rect.left(), y, rect.right(), y))
+class UndoHistory:
+    """Undo/redo stacks of commands that each store only what they changed."""
+
+    def __init__(self, depth=UNDO_DEPTH):
+        self.undo_stack, self.redo_stack = deque(maxlen=depth), []
+
+    def push(self, command):
+        # Consecutive moves of the same boxes collapse into a single undo step
+        if not (self.undo_stack and self.undo_stack[-1].merge(command)):
+            self.undo_stack.append(command)
+        self.redo_stack.clear()
+
+    def undo(self):
+        if self.undo_stack:
+            command = self.undo_stack.pop()
+            command.undo()
+            self.redo_stack.append(command)
+
+    def redo(self):
+        if self.redo_stack:
+            command = self.redo_stack.pop()
+            command.redo()
+            self.undo_stack.append(command)
+
+
+class GraphChange:
+    """Boxes and links added to or removed from the graph. The items themselves are kept, not copies."""
+
+    def __init__(self, win, added_boxes=(), removed_boxes=(), added_links=(), removed_links=()):
+        self.win = win
+        self.added_boxes, self.removed_boxes = list(added_boxes), list(removed_boxes)
+        self.added_links, self.removed_links = list(added_links), list(removed_links)
+
+    def apply(self, boxes_in, links_in, boxes_out, links_out):
+        for link in links_out:
+            if link in self.win.graph.links:
+                self.win.remove_link(link)
+        for box in boxes_out:
+            self.win.delete_box(box)
+        for box in boxes_in:
+            self.win.add_box_item(box)
+        for link in links_in:
+            self.win.insert_link(link)
+
+    def undo(self):
+        self.apply(self.removed_boxes, self.removed_links, self.added_boxes, self.added_links)
+
+    def redo(self):
+        self.apply(self.added_boxes, self.added_links, self.removed_boxes, self.removed_links)
+
+    def merge(self, other):
+        return False
+
+
+class MoveBoxes:
+    def __init__(self, moves):
+        self.moves = moves  # box -> (old position, new position)
+
+    def undo(self):
+        for box, (old, new) in self.moves.items():
+            box.setPos(old)
+
+    def redo(self):
+        for box, (old, new) in self.moves.items():
+            box.setPos(new)
+
+    def merge(self, other):
+        if not isinstance(other, MoveBoxes) or other.moves.keys() != self.moves.keys():
+            return False
+        self.moves = {box: (old, other.moves[box][1]) for box, (old, new) in self.moves.items()}
+        return True
+
+
+class EditBox:
+    FIELDS = ("folder_name", "button_name", "description", "media")
+
+    def __init__(self, box, old, new):
+        self.box, self.old, self.new = box, old, new
+
+    def set(self, values):
+        for field, value in zip(self.FIELDS, values):
+            setattr(self.box, field, value)
+        self.box.update_text()
+        self.box.main_win.search_index.update(self.box)
+
+    def undo(self):
+        self.set(self.old)
+
+    def redo(self):
+        self.set(self.new)
+
+    def merge(self, other):
+        return False
 
-        painter.setPen(QPen(QColor(230, 230, 230), 0))
-        painter.drawLines(lines)
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -121,16 +256,28 @@ class MainWindow(QMainWindow):
 
         self.bot_token = self.load_bot_token()
         self.main_text = "🚀 Welcome!"
-        self.scene, self.boxes, self.links = QGraphicsScene(), [], []
+        self.bot_menu = None
+        self.saved_infos = {}  # folder relative to root-menu/ -> info.yaml content last written or loaded
+        self.loading = False
+        self.scene = GridScene()
+        # Boxes and arrows, kept in sync with the scene by add_box_item/delete_box/add_link/remove_link
+        self.graph = MenuGraph()
+        self.search_index = SearchIndex()
+        self.search_hits, self.search_pos = [], 0
         self.view = QGraphicsView(self.scene)
         self.view.setRenderHint(QPainter.RenderHint.Antialiasing)
+        # Repaint only the regions that changed, found through the scene's BSP index
+        self.scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.BspTreeIndex)
+        self.view.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.MinimalViewportUpdate)
+        self.view.setCacheMode(QGraphicsView.CacheModeFlag.CacheBackground)
 
         # Enable cleaner multi-select and panning
         self.view.setDragMode(QGraphicsView.DragMode.RubberBandDrag)
         self.view.viewport().installEventFilter(self)
         self._last_mouse_pos = None
 
-        self.undo_stack, self.redo_stack = [], []
+        self.history = UndoHistory()
+        self.drag_start = {}  # box -> position when the current mouse drag began
         self.copied_boxes_data = []
 
         self.right_panel = QWidget()
@@ -177,23 +324,34 @@ class MainWindow(QMainWindow):
         for text, handler in [
             ("▶️ Start Bot", self.start_bot),
             ("+ Add Box", self.add_box),
+            ("🧭 Auto Layout", self.auto_layout),
             ("💾 Save", self.save_all),
             ("🔑 API Key", self.set_bot_token),
             ("📝 Edit Main Menu", self.edit_main_menu),
+            ("🖼 Optimize Media", self.optimize_media),
             ("↩️ Undo", self.undo),
             ("↪️ Redo", self.redo)
         ]:
             btn = QPushButton(text)
             btn.clicked.connect(handler)
             tb.addWidget(btn)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("🔍 Search boxes (Ctrl+F)")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.setMaximumWidth(300)
+        self.search_input.setToolTip("Finds boxes by button label, folder, description or media as you type; Enter jumps to the next one")
+        self.search_input.textChanged.connect(self.search_boxes)
+        self.search_input.returnPressed.connect(self.next_search_hit)
+        tb.addWidget(self.search_input)
         self.addToolBar(tb)
 
         self.current_box, self.link_origin, self.temp_arrow = None, None, None
         self.scene.selectionChanged.connect(self.on_selection)
+        self.scene.mousePressEvent = self.scene_mouse_press
         self.scene.mouseReleaseEvent = self.scene_mouse_release
+        # Only runs while a link is being dragged, to make the dashed arrow follow the cursor
         self.timer = QTimer()
-        self.timer.timeout.connect(self.update_arrows)
-        self.timer.start(30)
+        self.timer.timeout.connect(self.update_temp_arrow)
 
         self.load_existing()
     def eventFilter(self, obj, event):
@@ -215,78 +373,86 @@ class MainWindow(QMainWindow):
                 self.view.viewport().setCursor(Qt.CursorShape.ArrowCursor)
                 event.accept()
                 return True
+            elif event.type() == QEvent.Type.Wheel and event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+                # Ctrl + wheel zooms around the cursor
+                factor = 1.15 ** (event.angleDelta().y() / 120)
+                scale = self.view.transform().m11()
+                factor = max(0.05 / scale, min(4.0 / scale, factor))
+                self.view.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
+                self.view.scale(factor, factor)
+                event.accept()
+                return True
         return super().eventFilter(obj, event)
 
+    def busy_loading(self):
+        # Links are only added once every box is in: editing or saving the graph before then
+        # would work on a partial project
+        if self.loading:
+            self.statusBar().showMessage("Please wait until the project has finished loading", 3000)
+        return self.loading
+
     def keyPressEvent(self, event):
-        if event.key() == Qt.Key.Key_Delete:
+        if event.key() == Qt.Key.Key_Delete and not self.busy_loading():
             selected_boxes = [item for item in self.scene.selectedItems() if isinstance(item, RoundedBoxItem)]
             if selected_boxes:
                 confirm = QMessageBox.question(self, "Confirm Deletion", f"Delete {len(selected_boxes)} selected box(es)?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
                 if confirm == QMessageBox.StandardButton.Yes:
-                    self.save_undo()
+                    links = {link: None for box in selected_boxes for link in self.links_of(box)}
                     for box in selected_boxes:
                         self.delete_box(box)
+                    self.history.push(GraphChange(self, removed_boxes=selected_boxes, removed_links=links))
+        elif event.matches(QKeySequence.StandardKey.Find):
+            self.search_input.setFocus()
+            self.search_input.selectAll()
         elif event.matches(QKeySequence.StandardKey.Copy):
             self.copy_selected()
         elif event.matches(QKeySequence.StandardKey.Paste):
             self.paste_copied()
         super().keyPressEvent(event)
 
+    def add_box_item(self, box):
+        self.graph.add_box(box)
+        self.search_index.add(box)
+        self.scene.addItem(box)
+
     def delete_box(self, box):
-        to_remove = []
-        for link in self.links:
-            if link.start_box == box or link.end_box == box:
-                self.scene.removeItem(link)
-                to_remove.append(link)
-        for link in to_remove:
-            self.links.remove(link)
+        if box not in self.graph.box_index:
+            return
+        for link in self.graph.remove_box(box):
+            self.scene.removeItem(link)
+        self.search_index.remove(box)
         self.scene.removeItem(box)
-        if box in self.boxes:
-            self.boxes.remove(box)
+
+    def add_link(self, start_box, end_box):
+        return self.insert_link(ArrowItem(start_box, end_box))
+
+    def insert_link(self, arrow):
+        arrow.update_position()
+        self.graph.add_link(arrow)
+        self.scene.addItem(arrow)
+        return arrow
+
+    def remove_link(self, arrow):
+        self.graph.remove_link(arrow)
+        self.scene.removeItem(arrow)
+
+    def links_of(self, box):
+        return self.graph.links_of(box)
+
+    def children(self, box):
+        return self.graph.children(box)
 
     def undo(self):
-        if not self.undo_stack: return
-        state = self.undo_stack.pop()
-        self.redo_stack.append(self.capture_state())
-        self.restore_state(state)
+        if self.busy_loading():
+            return
+        self.finish_layout()
+        self.history.undo()
 
     def redo(self):
-        if not self.redo_stack: return
-        state = self.redo_stack.pop()
-        self.undo_stack.append(self.capture_state())
-        self.restore_state(state)
-
-    def save_undo(self):
-        self.undo_stack.append(self.capture_state())
-        self.redo_stack.clear()
-    def capture_state(self):
-        boxes_data, links_data = [], []
-        for b in self.boxes:
-            boxes_data.append((
-                b.folder_name, b.button_name, b.description, b.media,
-                b.scenePos().x(), b.scenePos().y()
-            ))
-        for l in self.links:
-            links_data.append((
-                self.boxes.index(l.start_box),
-                self.boxes.index(l.end_box)
-            ))
-        return (boxes_data, links_data)
-
-    def restore_state(self, state):
-        boxes_data, links_data = state
-        for item in self.boxes + self.links:
-            self.scene.removeItem(item)
-        self.boxes.clear()
-        self.links.clear()
-        for folder, label, desc, media, x, y in boxes_data:
-            b = RoundedBoxItem(MODULES_PATH / folder, label, desc, media, x, y, self)
-            self.scene.addItem(b)
-            self.boxes.append(b)
-        for start_idx, end_idx in links_data:
-            a = ArrowItem(self.boxes[start_idx], self.boxes[end_idx])
-            self.scene.addItem(a)
-            self.links.append(a)
+        if self.busy_loading():
+            return
+        self.finish_layout()
+        self.history.redo()
 
     def copy_selected(self):
         self.copied_boxes_data = [
@@ -296,18 +462,44 @@ class MainWindow(QMainWindow):
         ]
 
     def paste_copied(self):
-        if not self.copied_boxes_data:
+        if not self.copied_boxes_data or self.busy_loading():
             return
-        self.save_undo()
+        pasted = []
         for data in self.copied_boxes_data:
             folder = f"Box_{uuid.uuid4().hex[:6]}"
             label, desc, media, x, y = data[1], data[2], data[3], data[4]+20, data[5]+20
-            b = RoundedBoxItem(MODULES_PATH / folder, label, desc, media, x, y, self)
-            self.scene.addItem(b)
-            self.boxes.append(b)
+            pasted.append(RoundedBoxItem(MODULES_PATH / folder, label, desc, media, x, y, self))
+            self.add_box_item(pasted[-1])
+        self.history.push(GraphChange(self, added_boxes=pasted))
+
+    def search_boxes(self, text):
+        self.search_hits, self.search_pos = self.search_index.search(text, SEARCH_HITS), 0
+        if self.search_hits:
+            self.show_search_hit()
+        elif text.strip():
+            self.statusBar().showMessage(f"No box matches {text.strip()!r}", 3000)
+        else:
+            self.statusBar().clearMessage()
+
+    def next_search_hit(self):
+        if self.search_hits:
+            self.search_pos = (self.search_pos + 1) % len(self.search_hits)
+            self.show_search_hit()
+
+    def show_search_hit(self):
+        box = self.search_hits[self.search_pos]
+        if box not in self.graph.box_index:
+            # Deleted since the search ran
+            return self.search_boxes(self.search_input.text())
+        self.scene.clearSelection()
+        box.setSelected(True)
+        self.view.centerOn(box)
+        more = "+" if len(self.search_hits) == SEARCH_HITS else ""
+        self.statusBar().showMessage(f"{self.search_pos + 1} of {len(self.search_hits)}{more}: "
+                                     f"{box.button_name} ({box.folder_name}), Enter for the next")
 
     def on_selection(self):
-        selected_boxes = [box for box in self.boxes if box.isSelected()]
+        selected_boxes = [box for box in self.graph.boxes if box.isSelected()]
 
         if len(selected_boxes) == 1:
             box = selected_boxes[0]
@@ -330,7 +522,7 @@ class MainWindow(QMainWindow):
             # Read buttons_per_row from parent folder
             info_path = box.path.parent / "info.yaml"
             if info_path.exists():
-                info = yaml.safe_load(open(info_path)) or {}
+                info = read_info(info_path)
                 self.buttons_per_row_input.setValue(info.get("buttons_per_row", 1))
             else:
                 self.buttons_per_row_input.setValue(1)
@@ -351,7 +543,7 @@ class MainWindow(QMainWindow):
             self.buttons_per_row_input.setEnabled(False)
 
         # Reset brushes
-        for box in self.boxes:
+        for box in self.graph.boxes:
             if not box.isSelected():
                 box.setBrush(QBrush(QColor("#cde")))
 
@@ -368,7 +560,8 @@ class MainWindow(QMainWindow):
             "- Click '+ Add Box' to create a new menu node.\n"
             "- Drag the blue dot to another box to create a link.\n"
             "- Use Shift/Ctrl to multi-select and Delete to remove.\n"
-            "- Use Ctrl+C / Ctrl+V to copy/paste.\n\n"
+            "- Use Ctrl+C / Ctrl+V to copy/paste.\n"
+            "- Hold Ctrl and scroll to zoom; drag with the middle mouse button to pan.\n\n"
             "✏️ Editing Boxes:\n"
             "- Select a box by clicking it.\n"
             "- Edit its folder name (internal), button label, description, and media.\n"
@@ -380,38 +573,51 @@ class MainWindow(QMainWindow):
             "🚀 Starting the Bot:\n"
             "- Set your Telegram bot API key using '🔑 API Key'.\n"
             "- Click '▶️ Start Bot' to begin polling.\n"
+            "- Type in the search bar (Ctrl+F) to find a box by its label, folder, description or media; Enter jumps to the next match.\n"
+            "- '🧭 Auto Layout' arranges all boxes as a tree, top to bottom; undo puts them back.\n"
+            "- '🖼 Optimize Media' prepares smaller copies of your images; the bot uploads those instead.\n"
         )
 
     def start_link(self, origin_box):
+        if self.busy_loading():
+            return
         self.link_origin = origin_box
         self.temp_arrow = QGraphicsLineItem()
         self.temp_arrow.setPen(QPen(Qt.GlobalColor.darkGray, 1, Qt.PenStyle.DashLine))
         self.scene.addItem(self.temp_arrow)
         self.view.viewport().setCursor(Qt.CursorShape.CrossCursor)
+        self.timer.start(30)
+
+    def scene_mouse_press(self, event):
+        QGraphicsScene.mousePressEvent(self.scene, event)
+        self.drag_start = {item: item.pos() for item in self.scene.selectedItems() if isinstance(item, RoundedBoxItem)}
 
     def scene_mouse_release(self, event):
+        moves = {box: (old, box.pos()) for box, old in self.drag_start.items() if box.pos() != old}
+        if moves:
+            self.history.push(MoveBoxes(moves))
+        self.drag_start = {}
         if self.link_origin and self.temp_arrow:
             target = None
             for item in self.scene.items(event.scenePos()):
                 if isinstance(item, RoundedBoxItem) and item != self.link_origin:
                     target = item
             if target:
-                arrow = ArrowItem(self.link_origin, target)
-                self.links.append(arrow)
-                self.scene.addItem(arrow)
+                self.history.push(GraphChange(self, added_links=[self.add_link(self.link_origin, target)]))
             self.scene.removeItem(self.temp_arrow)
             self.temp_arrow, self.link_origin = None, None
+            self.timer.stop()
             self.view.viewport().setCursor(Qt.CursorShape.ArrowCursor)
         QGraphicsScene.mouseReleaseEvent(self.scene, event)
 
-    def update_arrows(self):
-        for link in self.links:
-            link.update_position()
+    def update_temp_arrow(self):
         if self.temp_arrow and self.link_origin:
             pos = self.view.mapToScene(self.view.mapFromGlobal(QCursor.pos()))
             self.temp_arrow.setLine(QLineF(self.link_origin.sceneBoundingRect().center(), pos))
 
     def add_box(self):
+        if self.busy_loading():
+            return
         folder = f"Box_{uuid.uuid4().hex[:6]}"
 
         # Current center of viewport → scene
@@ -419,21 +625,25 @@ class MainWindow(QMainWindow):
         x, y = center_in_scene.x(), center_in_scene.y()
 
         b = RoundedBoxItem(MODULES_PATH / folder, folder, "Description", "", x, y, self)
-        self.scene.addItem(b)
-        self.boxes.append(b)
+        self.add_box_item(b)
+        self.history.push(GraphChange(self, added_boxes=[b]))
 
         # Optional: center view on new box
         self.view.centerOn(b)
 
 
     def apply_box(self):
+        if self.busy_loading():
+            return
         if self.current_box:
             # Update current box properties
-            self.current_box.folder_name = self.folder_input.text()
-            self.current_box.button_name = self.button_input.text()
-            self.current_box.description = self.desc_input.toPlainText()
-            self.current_box.media = self.media_input.text()
-            self.current_box.update_text()
+            box = self.current_box
+            old = tuple(getattr(box, field) for field in EditBox.FIELDS)
+            new = (self.folder_input.text(), self.button_input.text(), self.desc_input.toPlainText(), self.media_input.text())
+            edit = EditBox(box, old, new)
+            edit.redo()
+            if new != old:
+                self.history.push(edit)
 
             # Save buttons_per_row in parent folder's info.yaml
             parent_path = self.current_box.path.parent
@@ -441,56 +651,94 @@ class MainWindow(QMainWindow):
 
             # If parent info.yaml exists, merge with old data
             if parent_info_path.exists():
-                parent_info = yaml.safe_load(open(parent_info_path)) or {}
+                parent_info = read_info(parent_info_path)
             else:
                 parent_info = {}
 
             parent_info["buttons_per_row"] = self.buttons_per_row_input.value()
-
-            yaml.safe_dump(parent_info, open(parent_info_path, "w"))
+            self.write_info(parent_path, parent_info)
+            for link in self.graph.incoming[self.current_box]:
+                if link.start_box.path == parent_path:
+                    link.start_box.buttons_per_row = parent_info["buttons_per_row"]
 
             # Save current box’s own info.yaml
-            box_info_path = self.current_box.path / "info.yaml"
-            children_paths = [
-                l.end_box.path.relative_to(MODULES_PATH).as_posix()
-                for l in self.links if l.start_box == self.current_box
-            ]
-            pos = self.current_box.scenePos()
-            yaml.safe_dump({
-                "label": self.current_box.button_name,
-                "description": self.current_box.description,
-                "media": self.current_box.media,
-                "children": children_paths,
-                "x": float(pos.x()),
-                "y": float(pos.y())
-            }, open(box_info_path, "w"))
-
+            rel = self.current_box.path.relative_to(MODULES_PATH).as_posix()
+            children = self.children(self.current_box)
+            self.write_info(self.current_box.path, self.box_info(self.current_box, [f"{rel}/{c.folder_name}" for c in children]))
+            self.reload_bot_menu()
 
+    def auto_layout(self):
+        if self.busy_loading():
+            return
+        if not self.graph.boxes:
+            return
+        self.finish_layout()
+        started = time.perf_counter()
+        positions = auto_layout(self.graph, [box.rect().height() for box in self.graph.boxes])
+        elapsed = time.perf_counter() - started
+        moves = {box: (box.pos(), QPointF(*positions[box])) for box in self.graph.boxes}
+        self.history.push(MoveBoxes(moves))
+        self.statusBar().showMessage(f"Laid out {len(moves)} boxes in {elapsed * 1000:.0f} ms", 5000)
+        # One animation drives every box; the scene index is rebuilt once at the end instead of per frame
+        self.layout_moves = [(box, old.x(), old.y(), new.x() - old.x(), new.y() - old.y())
+                             for box, (old, new) in moves.items()]
+        self.scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.NoIndex)
+        self.layout_animation = QVariantAnimation(self)
+        self.layout_animation.setDuration(LAYOUT_ANIMATION_MS)
+        self.layout_animation.setStartValue(0.0)
+        self.layout_animation.setEndValue(1.0)
+        self.layout_animation.setEasingCurve(QEasingCurve.Type.OutCubic)
+        self.layout_animation.valueChanged.connect(self.layout_step)
+        self.layout_animation.finished.connect(self.finish_layout)
+        self.layout_animation.start()
+
+    def place_unplaced(self, boxes):
+        # Boxes from menus written by hand or by other tools have no position; lay out just those,
+        # as a tree of their own to the right of the boxes that were placed, and leave the rest alone
+        unplaced = set(boxes)
+        placed = [box for box in self.graph.boxes if box not in unplaced]
+        left, top = 0.0, 0.0
+        if placed:
+            left = max(box.scenePos().x() + box.rect().width() for box in placed) + 200
+            top = min(box.scenePos().y() for box in placed)
+        positions = auto_layout(self.graph.subgraph(boxes), [box.rect().height() for box in boxes])
+        self.scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.NoIndex)
+        for box, (x, y) in positions.items():
+            box.setPos(left + x, top + y)
+        self.scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.BspTreeIndex)
+
+    def layout_step(self, t):
+        for box, x, y, dx, dy in self.layout_moves:
+            box.setPos(x + dx * t, y + dy * t)
+
+    def finish_layout(self):
+        if not getattr(self, "layout_moves", None):
+            return
+        self.layout_animation.stop()
+        self.layout_step(1.0)
+        self.layout_moves = None
+        self.scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.BspTreeIndex)
+        bounding_rect = self.scene.itemsBoundingRect()
+        self.scene.setSceneRect(bounding_rect.adjusted(-500, -500, 500, 500))
+
+    def box_info(self, box, children_paths):
+        pos = box.scenePos()
+        return box_info(box, children_paths, pos.x(), pos.y())
+
+    def write_info(self, folder, info):
+        write_info(folder, info)
+        if folder != MODULES_PATH:
+            self.saved_infos[folder.relative_to(MODULES_PATH).as_posix()] = info
 
     def save_all(self):
-        if MODULES_PATH.exists():
-            shutil.rmtree(MODULES_PATH)
-        MODULES_PATH.mkdir()
-
-        def save_box(box, path):
-            b_path = path / box.folder_name
-            b_path.mkdir()
-            children_paths = [l.end_box.path.relative_to(MODULES_PATH).as_posix()
-                              for l in self.links if l.start_box == box]
-            pos = box.scenePos()
-            yaml.safe_dump({
-                "label": box.button_name,
-                "description": box.description,
-                "media": box.media,
-                "children": children_paths,
-                "x": float(pos.x()),
-                "y": float(pos.y())
-            }, open(b_path / "info.yaml", "w"))
-            for link in [l for l in self.links if l.start_box == box]:
-                save_box(link.end_box, b_path)
-
-        for root in [b for b in self.boxes if not any(l.end_box == b for l in self.links)]:
-            save_box(root, MODULES_PATH)
+        if self.busy_loading():
+            return
+        # Only info.yaml files that differ from the last save are written (see graph.write_layout)
+        infos, locations = layout(self.graph, self.box_info)
+        write_layout(MODULES_PATH, infos, self.saved_infos)
+        for box, rel in locations.items():
+            box.path = MODULES_PATH / rel
+        self.reload_bot_menu()
 
     def start_bot(self):
         if not self.bot_token:
@@ -498,82 +746,81 @@ class MainWindow(QMainWindow):
             return
         if hasattr(self, 'bot_thread') and self.bot_thread.is_alive():
             return
+        # The bot stack is only imported once a test bot is started
+        from outbound import OutboundScheduler, install
+        self.bot_menu = load_menu(MODULES_PATH, self.main_text)
+        self.outbound = install(OutboundScheduler())
         self.bot_thread = threading.Thread(target=self.bot_loop, daemon=True)
         self.bot_thread.start()
 
     def bot_loop(self):
+        import telebot
+        from media_cache import MediaCache
+        from navigation import show_screen
+        from sessions import MemorySessions, navigate
         bot = telebot.TeleBot(self.bot_token, parse_mode="Markdown")
-        callback_map = {}
-
-        def build_keyboard(path=""):
-            m = telebot.types.InlineKeyboardMarkup()
-            folder = MODULES_PATH / path
-
-            # Read this folder's info.yaml to get buttons_per_row if specified
-            info_path = folder / "info.yaml"
-            if info_path.exists():
-                folder_info = yaml.safe_load(open(info_path))
-                per_row = max(1, folder_info.get("buttons_per_row", 1))  # default 1
-            else:
-                per_row = 1
-
-            # Collect all child buttons
-            buttons = []
-            for child in sorted(folder.iterdir()):
-                if child.is_dir():
-                    info = yaml.safe_load(open(child / "info.yaml"))
-                    lbl, cb = info.get("label", child.name), str(uuid.uuid4())[:8]
-                    btn = telebot.types.InlineKeyboardButton(lbl, callback_data=cb)
-                    callback_map[cb] = str(child.relative_to(MODULES_PATH))
-                    buttons.append(btn)
-
-            # Cap per_row to number of buttons if fewer
-            if len(buttons) < per_row:
-                per_row = len(buttons) if buttons else 1
-
-            # Arrange buttons into rows
-            for i in range(0, len(buttons), per_row):
-                m.row(*buttons[i:i+per_row])
-
-            # Add Back button if not at root
-            if path:
-                m.add(telebot.types.InlineKeyboardButton("⬅️ Back", callback_data="BACK"))
-
-            return m
-
+        media_cache = MediaCache(derivatives=Derivatives())
+        sessions = MemorySessions()
         @bot.message_handler(commands=["start"])
         def start(m):
-            bot.send_message(m.chat.id, self.main_text, reply_markup=build_keyboard())
+            sessions.delete(m.chat.id)
+            bot.send_message(m.chat.id, self.main_text, reply_markup=self.bot_menu.keyboards[""])
 
         @bot.callback_query_handler(func=lambda c: True)
         def cb(call):
-            path = callback_map.get(call.data, "")
-            folder, desc, media = None, "", None
-            if call.data == "BACK":
-                path = ""
-                desc = self.main_text
-            else:
-                folder = MODULES_PATH / path if path else None
-                if folder and (folder / "info.yaml").exists():
-                    info = yaml.safe_load(open(folder / "info.yaml"))
-                    desc, media = info.get("description", ""), info.get("media", "")
-                if not desc.strip():
-                    desc = self.main_text
-            try:
-                bot.delete_message(call.message.chat.id, call.message.message_id)
-            except:
-                pass
-            if media and Path(media).exists():
-                with open(media, "rb") as f:
-                    bot.send_photo(call.message.chat.id, f, caption=desc, reply_markup=build_keyboard(path))
-            else:
-                bot.send_message(call.message.chat.id, desc, reply_markup=build_keyboard(path))
+            menu = self.bot_menu
+            path, desc, media = navigate(menu, sessions, call.message.chat.id, call.data)
+            show_screen(bot, media_cache, call.message, desc, media, menu.keyboards[path])
         bot.infinity_polling()
 
+    def optimize_media(self):
+        if getattr(self, "media_jobs", None):
+            return
+        self.derivatives = Derivatives()
+        paths = self.derivatives.stale(sorted({b.media for b in self.graph.boxes if b.media and Path(b.media).is_file()}))
+        if not paths:
+            self.statusBar().showMessage("All media is already optimized", 5000)
+            return
+        # Encoding runs in other processes; a timer collects results so the canvas stays responsive
+        self.media_executor = pool()
+        self.media_jobs = {self.media_executor.submit(optimize, path): path for path in paths}
+        self.media_total, self.media_stats = len(paths), [0, 0, 0]  # files done, bytes before, bytes after
+        self.media_timer = QTimer()
+        self.media_timer.timeout.connect(self.media_progress)
+        self.media_timer.start(200)
+        self.statusBar().showMessage(f"Optimizing media… 0/{self.media_total}")
+
+    def media_progress(self):
+        for future in [f for f in self.media_jobs if f.done()]:
+            path = self.media_jobs.pop(future)
+            try:
+                entry = future.result()
+            except Exception as e:
+                print(f"[Bot] Could not optimize {path}: {e}")
+                continue
+            self.derivatives.record(path, entry)
+            self.media_stats[0] += 1
+            self.media_stats[1] += entry["size"]
+            self.media_stats[2] += entry["bytes"]
+        if self.media_jobs:
+            self.statusBar().showMessage(f"Optimizing media… {self.media_total - len(self.media_jobs)}/{self.media_total}")
+            return
+        self.media_timer.stop()
+        self.media_executor.shutdown(wait=False)
+        done, before, after = self.media_stats
+        self.statusBar().showMessage(f"Optimized {done} of {self.media_total} media files: "
+                                     f"{before / 2 ** 20:.1f} MiB → {after / 2 ** 20:.1f} MiB", 10000)
+
     def edit_main_menu(self):
         text, ok = QInputDialog.getText(self, "Main Menu Text", "Enter main menu text:", text=self.main_text)
         if ok:
             self.main_text = text
+            self.reload_bot_menu()
+
+    def reload_bot_menu(self):
+        # The running test bot serves prebuilt keyboards; rebuild them after the project changes on disk
+        if self.bot_menu is not None:
+            self.bot_menu = load_menu(MODULES_PATH, self.main_text)
 
     def set_bot_token(self):
         token, ok = QInputDialog.getText(self, "API Key", "Enter Bot API key:", QLineEdit.EchoMode.Password)
@@ -589,33 +836,80 @@ class MainWindow(QMainWindow):
             return getattr(cfg, "BOT_TOKEN", None)
 
     def load_existing(self):
-        box_map, children_map = {}, {}
-        for info_path in MODULES_PATH.rglob("info.yaml"):
+        # Walk and parse info.yaml files off the GUI thread and add the boxes in batches from a
+        # timer, so the window shows right away and stays responsive while a large project loads
+        self.loading = True
+        self.load_total, self.load_done, self.load_unplaced = 0, 0, []
+        self.load_queue, self.load_boxes, self.load_children = queue.Queue(), {}, {}
+
+        def parse_all():
+            try:
+                paths = info_paths(MODULES_PATH)
+                self.load_total = len(paths)  # only for the progress message
+                for item in read_infos(MODULES_PATH, paths):
+                    self.load_queue.put(item)
+            except Exception as e:
+                print(f"Loading {MODULES_PATH} failed: {e}")
+            finally:
+                self.load_queue.put(None)  # the walk is over, however it ended
+
+        threading.Thread(target=parse_all, daemon=True).start()
+        self.load_timer = QTimer()
+        self.load_timer.timeout.connect(self.load_batch)
+        self.load_timer.start(LOAD_INTERVAL_MS)
+
+    def load_batch(self):
+        finished = False
+        for _ in range(LOAD_BATCH):
+            try:
+                item = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            info_path, info = item
+            self.load_done += 1
+            if isinstance(info, Exception):
+                print(f"Skipping {info_path}: {info}")
+                continue
             folder = info_path.parent
-            info = yaml.safe_load(open(info_path))
             x, y = info.get("x", 50), info.get("y", 50)
             box = RoundedBoxItem(folder, info.get("label", ""), info.get("description", ""), info.get("media", ""), x, y, self)
             box.buttons_per_row = info.get("buttons_per_row", 1)
-            self.scene.addItem(box)
-            self.boxes.append(box)
+            self.add_box_item(box)
+            if "x" not in info or "y" not in info:
+                self.load_unplaced.append(box)
             rel_path = folder.relative_to(MODULES_PATH).as_posix()
-            box_map[rel_path] = box
-            children_map[rel_path] = info.get("children", [])
-        for parent_rel, children_rels in children_map.items():
-            parent_box = box_map[parent_rel]
+            self.saved_infos[rel_path] = info
+            self.load_boxes[rel_path] = box
+            self.load_children[rel_path] = info.get("children", [])
+        self.statusBar().showMessage(f"Loading project… {self.load_done}/{max(self.load_total, self.load_done)}")
+        if not finished:
+            return
+
+        self.load_timer.stop()
+        for parent_rel, children_rels in self.load_children.items():
+            parent_box = self.load_boxes[parent_rel]
             for child_rel in children_rels:
-                if child_rel in box_map:
-                    child_box = box_map[child_rel]
-                    arrow = ArrowItem(parent_box, child_box)
-                    self.links.append(arrow)
-                    self.scene.addItem(arrow)
-        if self.boxes:
+                if child_rel in self.load_boxes:
+                    self.add_link(parent_box, self.load_boxes[child_rel])
+        self.load_boxes, self.load_children, self.loading = {}, {}, False
+        if not self.load_done:
+            self.statusBar().clearMessage()
+            return
+        self.statusBar().showMessage(f"Loaded {len(self.graph.boxes)} boxes", 5000)
+        if self.load_unplaced:
+            self.place_unplaced(self.load_unplaced)
+            self.statusBar().showMessage(f"Loaded {len(self.graph.boxes)} boxes and laid out "
+                                         f"{len(self.load_unplaced)} without a position", 5000)
+            self.load_unplaced = []
+        if self.graph.boxes:
             bounding_rect = self.scene.itemsBoundingRect()
             self.scene.setSceneRect(bounding_rect.adjusted(-500, -500, 500, 500))
             self.view.centerOn(bounding_rect.center())
 
 
-
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     mw = MainWindow()
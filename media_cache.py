@@ -0,0 +1,133 @@
+import json, os, hashlib, threading, asyncio
+from pathlib import Path
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+MEDIA_CACHE_PATH = Path("media_cache.json")
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_bad_file_id(e):
+    return e.error_code == 400 and "file" in e.description.lower()
+
+
+class MediaCache:
+    """Remembers the file_id Telegram returned for each uploaded media file.
+
+    Entries are keyed by media path and invalidated when the file's content changes;
+    a changed mtime alone (e.g. a re-save of the same bytes) is confirmed by hash.
+    With ``derivatives`` (media_pipeline.Derivatives), uploads send the optimized copy of a file.
+    """
+
+    def __init__(self, path=MEDIA_CACHE_PATH, derivatives=None):
+        self.path, self.derivatives = Path(path), derivatives
+        self.lock = threading.Lock()
+        self.entries = self._read()
+
+    def _read(self, default=None):
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            print(f"[Bot] Ignoring unreadable media cache {self.path}")
+            return {} if default is None else dict(default)
+
+    def get(self, media):
+        with self.lock:
+            entry = self.entries.get(media)
+        if not entry:
+            return None
+        st = os.stat(media)
+        if (entry["mtime_ns"], entry["size"]) == (st.st_mtime_ns, st.st_size):
+            return entry["file_id"]
+        if entry["size"] == st.st_size and entry["sha256"] == file_digest(media):
+            self.put(media, entry["file_id"], entry["sha256"])
+            return entry["file_id"]
+        self.discard(media)
+        return None
+
+    def put(self, media, file_id, digest=None):
+        st = os.stat(media)
+        entry = {"file_id": file_id, "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                 "sha256": digest or file_digest(media)}
+        with self.lock:
+            self._save(media, entry)
+
+    def discard(self, media):
+        with self.lock:
+            self._save(media, None)  # even if only another process has it: its file_id is just as stale
+
+    def upload_path(self, media):
+        return self.derivatives.resolve(media) if self.derivatives else media
+
+    def _save(self, media, entry):
+        # Several bot processes share one cache file: apply this one change to what is on disk now,
+        # so what the other processes recorded or discarded meanwhile stands (and is picked up)
+        entries = self._read(default=self.entries)
+        if entry is None:
+            entries.pop(media, None)
+        else:
+            entries[media] = entry
+        self.entries = entries
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entries), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def send_photo(self, bot, chat_id, media, **kwargs):
+        """Send ``media`` by cached file_id, uploading it only the first time or after it changed."""
+        return self._deliver(media, lambda photo: bot.send_photo(chat_id, photo, **kwargs))
+
+    def edit_photo(self, bot, chat_id, message_id, media, caption, reply_markup=None):
+        """Replace the photo and caption of an existing message, reusing the cached file_id."""
+        return self._deliver(media, lambda photo: bot.edit_message_media(
+            types.InputMediaPhoto(photo, caption=caption, parse_mode=bot.parse_mode),
+            chat_id, message_id, reply_markup=reply_markup
+        ))
+
+    def _deliver(self, media, call):
+        file_id = self.get(media)
+        if file_id:
+            try:
+                return call(file_id)
+            except ApiTelegramException as e:
+                if not is_bad_file_id(e):
+                    raise
+                # file_id no longer valid for this bot (e.g. the token changed); upload again
+                self.discard(media)
+        with open(self.upload_path(media), "rb") as f:
+            msg = call(f)
+        self.put(media, msg.photo[-1].file_id)
+        return msg
+
+    async def send_photo_async(self, bot, chat_id, media, **kwargs):
+        """send_photo for an AsyncTeleBot; disk work runs off the event loop."""
+        return await self._deliver_async(media, lambda photo: bot.send_photo(chat_id, photo, **kwargs))
+
+    async def edit_photo_async(self, bot, chat_id, message_id, media, caption, reply_markup=None):
+        return await self._deliver_async(media, lambda photo: bot.edit_message_media(
+            types.InputMediaPhoto(photo, caption=caption, parse_mode=bot.parse_mode),
+            chat_id, message_id, reply_markup=reply_markup
+        ))
+
+    async def _deliver_async(self, media, call):
+        from telebot.asyncio_helper import ApiTelegramException as AsyncApiTelegramException
+        file_id = await asyncio.to_thread(self.get, media)
+        if file_id:
+            try:
+                return await call(file_id)
+            except AsyncApiTelegramException as e:
+                if not is_bad_file_id(e):
+                    raise
+                await asyncio.to_thread(self.discard, media)
+        with open(await asyncio.to_thread(self.upload_path, media), "rb") as f:
+            msg = await call(f)
+        await asyncio.to_thread(self.put, media, msg.photo[-1].file_id)
+        return msg
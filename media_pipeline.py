@@ -0,0 +1,148 @@
+import io, os, json, argparse, threading
+from pathlib import Path
+from concurrent.futures import as_completed
+from media_cache import file_digest
+
+DERIVATIVES_PATH = Path("media-cache")
+MAX_SIDE = 1280   # Telegram scales photos down to this anyway
+QUALITY = 85
+
+
+def optimize(source, cache_dir=DERIVATIVES_PATH, max_side=MAX_SIDE, quality=QUALITY):
+    """Write a resized, recompressed JPEG of ``source`` without its metadata and return its index entry.
+
+    Derivatives are named after the source's content and the settings, so identical files share one.
+    Runs in worker processes; needs Pillow.
+    """
+    from PIL import Image, ImageOps
+
+    st = os.stat(source)
+    digest = file_digest(source)
+    name = f"{digest[:32]}-{max_side}q{quality}.jpg"
+    target = Path(cache_dir) / name
+    if not target.exists():
+        with Image.open(source) as im:
+            im = ImageOps.exif_transpose(im)
+            if im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info):
+                im = im.convert("RGBA")
+                flat = Image.new("RGB", im.size, "white")
+                flat.paste(im, mask=im.getchannel("A"))
+                im = flat
+            else:
+                im = im.convert("RGB")
+            im.thumbnail((max_side, max_side), Image.LANCZOS)
+            out = io.BytesIO()
+            # No exif/icc arguments: the derivative carries no metadata
+            im.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{name}.{os.getpid()}.tmp")
+        tmp.write_bytes(out.getvalue())
+        os.replace(tmp, target)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest, "file": name,
+            "bytes": target.stat().st_size, "settings": [max_side, quality]}
+
+
+class Derivatives:
+    """Which optimized file to upload for each media file, as listed in media-cache/index.json.
+
+    A media file that is new or changed since it was optimized is sent as it is.
+    """
+
+    def __init__(self, cache_dir=DERIVATIVES_PATH):
+        self.dir = Path(cache_dir)
+        self.index_path = self.dir / "index.json"
+        self.lock = threading.Lock()
+        self.entries, self._stamp = {}, None
+
+    def _load(self):
+        try:
+            st = self.index_path.stat()
+        except FileNotFoundError:
+            return
+        if (st.st_mtime_ns, st.st_size) != self._stamp:
+            try:
+                entries = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except ValueError:
+                return  # caught mid-write by another process; keep the previous index
+            with self.lock:
+                self.entries, self._stamp = entries, (st.st_mtime_ns, st.st_size)
+
+    def _current(self, media, settings=None):
+        entry = self.entries.get(media)
+        if entry is None or (settings is not None and entry["settings"] != list(settings)):
+            return None
+        try:
+            st = os.stat(media)
+        except OSError:
+            return None
+        if (entry["mtime_ns"], entry["size"]) != (st.st_mtime_ns, st.st_size) or not (self.dir / entry["file"]).exists():
+            return None
+        return entry
+
+    def resolve(self, media):
+        """Path of the file to upload for ``media``."""
+        self._load()
+        entry = self._current(media)
+        return str(self.dir / entry["file"]) if entry else media
+
+    def stale(self, paths, max_side=MAX_SIDE, quality=QUALITY):
+        """The ``paths`` that have no up-to-date derivative for these settings."""
+        self._load()
+        return [path for path in paths if self._current(path, (max_side, quality)) is None]
+
+    def record(self, media, entry):
+        with self.lock:
+            self.entries[media] = entry
+            self.dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_name(f"index.json.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self.entries, indent=1), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+            st = self.index_path.stat()
+            self._stamp = (st.st_mtime_ns, st.st_size)
+
+
+def pool(workers=None):
+    # Imported here: the bot only needs Derivatives from this module
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    # Spawned, not forked: the editor has Qt and other threads running
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def media_paths(nodes):
+    return sorted({node.media for node in nodes.values() if node.media and Path(node.media).is_file()})
+
+
+def optimize_all(paths, derivatives, workers=None, max_side=MAX_SIDE, quality=QUALITY):
+    """Optimize every path without a current derivative; returns (files done, bytes before, bytes after)."""
+    paths = derivatives.stale(paths, max_side, quality)
+    done, before, after = 0, 0, 0
+    with pool(workers) as executor:
+        futures = {executor.submit(optimize, path, derivatives.dir, max_side, quality): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                print(f"Could not optimize {path}: {e}")
+                continue
+            derivatives.record(path, entry)
+            done += 1
+            before, after = before + entry["size"], after + entry["bytes"]
+            print(f"[{done}/{len(paths)}] {path}: {entry['size'] // 1024} KiB -> {entry['bytes'] // 1024} KiB")
+    return done, before, after
+
+
+if __name__ == "__main__":
+    from menu import MODULES_PATH, load_nodes
+
+    parser = argparse.ArgumentParser(description="Write upload-ready copies of every image used in root-menu/ "
+                                                 "to media-cache/; the bot sends those instead of the originals.")
+    parser.add_argument("root", nargs="?", default=str(MODULES_PATH), help="menu folder (default: root-menu)")
+    parser.add_argument("--workers", type=int, help="processes to use (default: one per CPU)")
+    parser.add_argument("--max-side", type=int, default=MAX_SIDE, help="longest side in pixels")
+    parser.add_argument("--quality", type=int, default=QUALITY, help="JPEG quality, 1-95")
+    args = parser.parse_args()
+    paths = media_paths(load_nodes(args.root))
+    done, before, after = optimize_all(paths, Derivatives(), args.workers, args.max_side, args.quality)
+    print(f"{len(paths)} media files, {done} optimized: {before / 2 ** 20:.1f} MiB -> {after / 2 ** 20:.1f} MiB")
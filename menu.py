@@ -0,0 +1,165 @@
+import hashlib, json, threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
+from metrics import KEYBOARD_BUILD_SECONDS
+
+MODULES_PATH = Path("root-menu")
+DEFAULT_MAIN_TEXT = "🚀 Welcome!"
+BACK = "BACK"
+
+
+class MenuNode(NamedTuple):
+    id: str               # folder path relative to root-menu/ ("" for the main menu)
+    label: str
+    description: str
+    media: str
+    children: tuple       # child node ids, in folder order
+    buttons_per_row: int
+
+
+class Menu(NamedTuple):
+    nodes: MappingProxyType      # node id -> MenuNode
+    keys: MappingProxyType       # callback_data -> node id
+    keyboards: MappingProxyType  # node id -> serialized InlineKeyboardMarkup
+
+    def show(self, node_id):
+        """(node id, text, media) of a node's screen."""
+        node = self.nodes[node_id]
+        text = node.description if node.description.strip() else self.nodes[""].description
+        return node_id, text, node.media
+
+
+def read_info(info_path):
+    # Imported here so a bot serving a compiled bundle never loads PyYAML
+    import yaml
+    # libyaml's C parser when PyYAML was built with it; several times faster than the pure-Python one
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(info_path, encoding="utf-8") as f:
+        return yaml.load(f, Loader=loader) or {}
+
+
+def node_key(node_id):
+    # Stable across restarts and always well inside Telegram's 64-byte callback_data limit
+    return hashlib.blake2b(node_id.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def load_nodes(root=MODULES_PATH, main_text=None, read=read_info):
+    """Parse the whole root-menu/ folder into a read-only {node id: MenuNode} map."""
+    root = Path(root)
+    main_menu_file = root / "main_menu.txt"
+    if main_text is None:
+        main_text = main_menu_file.read_text(encoding="utf-8").strip() if main_menu_file.exists() else DEFAULT_MAIN_TEXT
+
+    nodes = {}
+
+    def walk(folder, node_id):
+        info_path = folder / "info.yaml"
+        info = read(info_path) if info_path.exists() else {}
+        children = []
+        for child in sorted(folder.iterdir()):
+            if child.is_dir() and (child / "info.yaml").exists():
+                child_id = f"{node_id}/{child.name}" if node_id else child.name
+                walk(child, child_id)
+                children.append(child_id)
+        if node_id:
+            label, desc, media = info.get("label", folder.name), info.get("description", ""), info.get("media", "")
+        else:
+            label, desc, media = "", main_text, ""
+        nodes[node_id] = MenuNode(
+            node_id, str(label or ""), str(desc or ""), str(media or ""), tuple(children),
+            max(1, int(info.get("buttons_per_row", 1) or 1))
+        )
+
+    if root.is_dir():
+        walk(root, "")
+    else:
+        nodes[""] = MenuNode("", "", main_text, "", (), 1)
+    return MappingProxyType(nodes)
+
+
+def build_keyboard(nodes, node_id):
+    buttons = [
+        {"text": nodes[child_id].label, "callback_data": node_key(child_id)}
+        for child_id in nodes[node_id].children
+    ]
+    per_row = min(nodes[node_id].buttons_per_row, len(buttons)) or 1
+    rows = [buttons[i:i + per_row] for i in range(0, len(buttons), per_row)]
+    if node_id:
+        rows.append([{"text": "⬅️ Back", "callback_data": BACK}])
+    return json.dumps({"inline_keyboard": rows}, ensure_ascii=False)
+
+
+def compile_menu(nodes, previous=None):
+    """Precompute callback keys and one serialized keyboard per node.
+
+    Keyboards of nodes that are unchanged since ``previous`` (node and child labels) are reused.
+    """
+    def keyboard(node_id):
+        node = nodes[node_id]
+        if previous is not None and previous.nodes.get(node_id) == node and \
+                all(previous.nodes.get(c) == nodes[c] for c in node.children):
+            return previous.keyboards[node_id]
+        with KEYBOARD_BUILD_SECONDS.time():
+            return build_keyboard(nodes, node_id)
+
+    return Menu(
+        MappingProxyType(nodes),
+        MappingProxyType({node_key(node_id): node_id for node_id in nodes}),
+        MappingProxyType({node_id: keyboard(node_id) for node_id in nodes})
+    )
+
+
+def load_menu(root=MODULES_PATH, main_text=None):
+    return compile_menu(load_nodes(root, main_text))
+
+
+class MenuLoader:
+    """Holds the live Menu and swaps in a rebuilt one when root-menu/ changes on disk."""
+
+    def __init__(self, root=MODULES_PATH, main_text=None):
+        self.root, self.main_text = Path(root), main_text
+        self.menu = None
+        self._infos = {}  # info.yaml path -> ((mtime_ns, size), parsed info)
+        self._stop = threading.Event()
+
+    def _read(self, info_path):
+        st = info_path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._infos.get(info_path)
+        if cached is None or cached[0] != stamp:
+            cached = self._infos[info_path] = (stamp, read_info(info_path))
+        self._seen.add(info_path)
+        return cached[1]
+
+    def reload(self):
+        """Re-parse only the info.yaml files whose mtime or size changed.
+
+        Returns True when a new menu was swapped in.
+        """
+        self._seen = set()
+        nodes = load_nodes(self.root, self.main_text, self._read)
+        for info_path in self._infos.keys() - self._seen:
+            del self._infos[info_path]
+        if self.menu is not None and dict(nodes) == dict(self.menu.nodes):
+            return False
+        # A single attribute assignment: handlers see either the old or the new tree, never a mix
+        self.menu = compile_menu(nodes, self.menu)
+        return True
+
+    def watch(self, interval=2.0, on_reload=None):
+        """Poll root-menu/ for changes from a daemon thread; ``on_reload(menu)`` runs after each swap."""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    if self.reload():
+                        print(f"[Bot] Menu reloaded ({len(self.menu.nodes)} nodes)")
+                        if on_reload:
+                            on_reload(self.menu)
+                except Exception as e:
+                    # Usually a file caught mid-write; keep serving the previous menu and retry
+                    print(f"[Bot] Menu reload failed, keeping previous menu: {e}")
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,150 @@
+import sys, json, time, bisect, threading, contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_metrics = []
+_log = None  # stream for structured logs, None when off
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format(name, labels, value, extra=()):
+    pairs = [*labels, *extra]
+    if pairs:
+        inner = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                         for k, v in pairs)
+        name = f"{name}{{{inner}}}"
+    return f"{name} {value:.17g}" if isinstance(value, float) else f"{name} {value}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name, self.help, self.kind = name, help, "counter"
+        self.values = {}
+        self.lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = _labels(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [_format(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge:
+    """A value read from ``read()`` at scrape time."""
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.kind, self.read = name, help, "gauge", read
+        _metrics.append(self)
+
+    def samples(self):
+        return [_format(self.name, (), self.read())]
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.kind, self.buckets = name, help, "histogram", tuple(buckets)
+        self.values = {}  # labels -> [count per bucket (last one is +Inf), sum]
+        self.lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = _labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+        if _log is not None:
+            log(self.name, seconds=round(value, 6), **labels)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe how long the ``with`` block takes; ``labels`` may be filled in inside it."""
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        for key, counts, total in values:
+            running = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                running += count
+                lines.append(_format(self.name + "_bucket", key, running, (("le", bound),)))
+            lines.append(_format(self.name + "_sum", key, total))
+            lines.append(_format(self.name + "_count", key, running))
+        return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def enable_logs(stream=sys.stderr):
+    """Also write every timing as one JSON object per line to ``stream``."""
+    global _log
+    _log = stream
+
+
+def log(event, **fields):
+    if _log is not None:
+        _log.write(json.dumps({"ts": round(time.time(), 6), "event": event, **fields}, ensure_ascii=False, default=str) + "\n")
+        _log.flush()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(address):
+    """Serve /metrics on ``address`` ("host:port" or a port) from a daemon thread."""
+    host, _, port = str(address).rpartition(":")
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[Bot] Serving metrics on http://{host or '127.0.0.1'}:{port}/metrics")
+    return server
+
+
+UPDATES = Counter("bot_updates_total", "Updates received, by kind")
+UPDATE_SECONDS = Histogram("bot_update_seconds", "Time to handle one update, by kind")
+MENU_LOOKUP_SECONDS = Histogram("bot_menu_lookup_seconds", "Time to resolve a tapped button to its screen")
+CALLBACKS = Counter("bot_callbacks_total", "Menu screens opened, by node")
+KEYBOARD_BUILD_SECONDS = Histogram("bot_keyboard_build_seconds", "Time to build one node's keyboard")
+API_SECONDS = Histogram("bot_api_request_seconds", "Bot API request latency including retries, by method")
+API_REQUESTS = Counter("bot_api_requests_total", "Bot API HTTP responses, by method and status")
+FLOOD_WAITS = Counter("bot_api_flood_waits_total", "429 Too Many Requests answers, by method")
+UPLOAD_BYTES = Counter("bot_upload_bytes_total", "Bytes of media uploaded, by method")
+SEND_DELAY_SECONDS = Histogram("bot_send_delay_seconds", "Time requests waited for their rate-limit slot")
@@ -0,0 +1,60 @@
+from pathlib import Path
+from telebot.apihelper import ApiTelegramException
+
+
+def is_not_modified(e):
+    # Telegram refuses edits that would leave the message exactly as it is
+    return e.error_code == 400 and "not modified" in e.description
+
+
+def show_screen(bot, media_cache, message, text, media, reply_markup):
+    """Turn ``message`` (the menu that was tapped) into the next screen.
+
+    The message is edited in place when possible: one API call instead of delete + send.
+    Only switching between a text and a photo screen needs a fresh message.
+    """
+    chat_id, message_id = message.chat.id, message.message_id
+    has_media = bool(media) and Path(media).exists()
+    kind = getattr(message, "content_type", None)  # None for messages too old for the bot to access
+    try:
+        if has_media and kind == "photo":
+            return media_cache.edit_photo(bot, chat_id, message_id, media, text, reply_markup)
+        if not has_media and kind == "text":
+            return bot.edit_message_text(text, chat_id, message_id, reply_markup=reply_markup)
+    except ApiTelegramException as e:
+        if is_not_modified(e):
+            return None
+        # Not editable (e.g. deleted meanwhile); fall back to a new message
+
+    try:
+        bot.delete_message(chat_id, message_id)
+    except ApiTelegramException as e:
+        # Messages older than 48h can't be deleted; the new screen is sent regardless
+        print(f"[Bot] Could not delete message {message_id} in chat {chat_id}: {e.description}")
+    if has_media:
+        return media_cache.send_photo(bot, chat_id, media, caption=text, reply_markup=reply_markup)
+    return bot.send_message(chat_id, text, reply_markup=reply_markup)
+
+
+async def show_screen_async(bot, media_cache, message, text, media, reply_markup):
+    """show_screen for an AsyncTeleBot."""
+    from telebot.asyncio_helper import ApiTelegramException as AsyncApiTelegramException
+    chat_id, message_id = message.chat.id, message.message_id
+    has_media = bool(media) and Path(media).exists()
+    kind = getattr(message, "content_type", None)  # None for messages too old for the bot to access
+    try:
+        if has_media and kind == "photo":
+            return await media_cache.edit_photo_async(bot, chat_id, message_id, media, text, reply_markup)
+        if not has_media and kind == "text":
+            return await bot.edit_message_text(text, chat_id, message_id, reply_markup=reply_markup)
+    except AsyncApiTelegramException as e:
+        if is_not_modified(e):
+            return None
+
+    try:
+        await bot.delete_message(chat_id, message_id)
+    except AsyncApiTelegramException as e:
+        print(f"[Bot] Could not delete message {message_id} in chat {chat_id}: {e.description}")
+    if has_media:
+        return await media_cache.send_photo_async(bot, chat_id, media, caption=text, reply_markup=reply_markup)
+    return await bot.send_message(chat_id, text, reply_markup=reply_markup)
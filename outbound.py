@@ -0,0 +1,234 @@
+import os, sys, time, asyncio, threading
+import requests
+from telebot import apihelper
+from metrics import API_SECONDS, API_REQUESTS, FLOOD_WAITS, UPLOAD_BYTES, SEND_DELAY_SECONDS, Gauge
+
+
+class OutboundQueueFull(RuntimeError):
+    pass
+
+
+class Bucket:
+    """Token bucket kept as a theoretical arrival time (GCRA), so slots can be booked in advance."""
+
+    def __init__(self, rate, burst):
+        self.interval = 1.0 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self.tat = 0.0
+
+    def earliest(self, now):
+        return max(now, self.tat - self.tolerance)
+
+    def book(self, at):
+        self.tat = max(self.tat, at) + self.interval
+
+    def hold(self, until):
+        # Flood control: nothing goes out before ``until``
+        self.tat = max(self.tat, until + self.tolerance)
+
+
+class OutboundScheduler:
+    """Paces every Bot API call that targets a chat to Telegram's flood limits.
+
+    A global bucket (~30 messages/s) and one bucket per chat (about 1/s in private chats,
+    20/min in groups) decide when each request may go out. Callers sleep until their chat's
+    slot and only then take a global one, so a chat that is held back never delays the others.
+    A 429 answer holds the chat for ``retry_after`` seconds and the request is retried.
+    At most ``max_queue`` requests wait at once; further ones fail with OutboundQueueFull.
+    """
+
+    def __init__(self, rate=30, chat_rate=1, group_rate=20 / 60, burst=3, max_queue=1000, max_retries=5):
+        self.rate, self.chat_rate, self.group_rate, self.burst = rate, chat_rate, group_rate, burst
+        self.max_queue, self.max_retries = max_queue, max_retries
+        self.global_bucket = Bucket(rate, rate)
+        self.chat_buckets = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = {"sent": 0, "delayed": 0, "wait_seconds": 0.0, "flood_waits": 0, "rejected": 0, "queued": 0}
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= 10000:
+                # Forget chats whose bucket is full again; a fresh one behaves the same
+                self.chat_buckets = {c: b for c, b in self.chat_buckets.items() if b.tat > now}
+            group = str(chat_id).startswith("-")
+            bucket = self.chat_buckets[chat_id] = Bucket(self.group_rate if group else self.chat_rate, self.burst)
+        return bucket
+
+    def reserve(self, chat_id):
+        """Book the next free slot for ``chat_id`` and return how many seconds to wait for it.
+
+        After that wait, ``reserve_global`` books the slot under the overall rate.
+        """
+        with self.lock:
+            if self.stats["queued"] >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise OutboundQueueFull(f"{self.stats['queued']} Bot API requests already waiting")
+            now = time.monotonic()
+            bucket = self._chat_bucket(chat_id, now)
+            at = bucket.earliest(now)
+            bucket.book(at)
+            delay = at - now
+            self.stats["sent"] += 1
+            if delay > 0:
+                self.stats["delayed"] += 1
+                self.stats["wait_seconds"] += delay
+                self.stats["queued"] += 1
+            return delay
+
+    def reserve_global(self):
+        # Booked only once the chat's own slot is due: booking a future slot here would push the
+        # shared bucket forward and make every other chat wait along
+        with self.lock:
+            now = time.monotonic()
+            at = self.global_bucket.earliest(now)
+            self.global_bucket.book(at)
+            delay = at - now
+            if delay > 0:
+                self.stats["wait_seconds"] += delay
+            return delay
+
+    def done_waiting(self, delay):
+        if delay > 0:
+            with self.lock:
+                self.stats["queued"] -= 1
+
+    def flood(self, chat_id, retry_after, method):
+        FLOOD_WAITS.inc(method=method)
+        with self.lock:
+            self.stats["flood_waits"] += 1
+            self._chat_bucket(chat_id, time.monotonic()).hold(time.monotonic() + retry_after)
+        print(f"[Bot] Flood limit hit for chat {chat_id}, retrying in {retry_after}s")
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def _session(self):
+        # requests.Session is not thread-safe; keep one keep-alive session per thread
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def send(self, method, url, params=None, files=None, **kwargs):
+        """apihelper.CUSTOM_REQUEST_SENDER for the threaded TeleBot."""
+        chat_id = (params or {}).get("chat_id")
+        api_method = url.rsplit("/", 1)[-1]
+        with API_SECONDS.time(method=api_method):
+            for attempt in range(self.max_retries + 1):
+                if chat_id is not None:
+                    delay = self.reserve(chat_id)
+                    try:
+                        time.sleep(max(delay, 0))
+                        wait = self.reserve_global()
+                        time.sleep(max(wait, 0))
+                    finally:
+                        self.done_waiting(delay)
+                    SEND_DELAY_SECONDS.observe(max(delay, 0) + max(wait, 0))
+                rewind(files)
+                count_upload(api_method, files)
+                result = self._session().request(method, url, params=params, files=files, **kwargs)
+                API_REQUESTS.inc(method=api_method, status=result.status_code)
+                if result.status_code != 429 or chat_id is None or attempt == self.max_retries:
+                    return result
+                self.flood(chat_id, retry_after(result.json()), api_method)
+
+    def wrap_async(self, process_request):
+        """Wrap asyncio_helper._process_request with the same pacing and 429 retries."""
+        from telebot.asyncio_helper import ApiTelegramException
+
+        async def request(token, url, method, params, files, kwargs):
+            # url is just the Bot API method name here
+            count_upload(url, files)
+            try:
+                result = await process_request(token, url, method, params, files, **kwargs)
+            except ApiTelegramException as e:
+                API_REQUESTS.inc(method=url, status=e.error_code)
+                raise
+            API_REQUESTS.inc(method=url, status=200)
+            return result
+
+        async def process(token, url, method="get", params=None, files=None, **kwargs):
+            chat_id = (params or {}).get("chat_id")
+            with API_SECONDS.time(method=url):
+                if chat_id is None:
+                    return await request(token, url, method, params, files, kwargs)
+                for attempt in range(self.max_retries + 1):
+                    delay = self.reserve(chat_id)
+                    try:
+                        await asyncio.sleep(max(delay, 0))
+                        wait = self.reserve_global()
+                        await asyncio.sleep(max(wait, 0))
+                    finally:
+                        self.done_waiting(delay)
+                    SEND_DELAY_SECONDS.observe(max(delay, 0) + max(wait, 0))
+                    rewind(files)
+                    try:
+                        return await request(token, url, method, params, files, kwargs)
+                    except ApiTelegramException as e:
+                        if e.error_code != 429 or attempt == self.max_retries:
+                            raise
+                        self.flood(chat_id, retry_after(e.result_json), url)
+        return process
+
+
+def retry_after(result_json):
+    return (result_json.get("parameters") or {}).get("retry_after", 1)
+
+
+def count_upload(method, files):
+    size = 0
+    for value in (files or {}).values():
+        f = value[1] if isinstance(value, tuple) else value
+        f = getattr(f, "file", f)  # types.InputFile
+        if isinstance(f, (bytes, bytearray)):
+            size += len(f)
+        elif hasattr(f, "fileno"):
+            size += os.fstat(f.fileno()).st_size
+    if size:
+        UPLOAD_BYTES.inc(size, method=method)
+
+
+def rewind(files):
+    # A retried upload must send the file from the start again
+    for value in (files or {}).values():
+        f = value[1] if isinstance(value, tuple) else value
+        f = getattr(f, "file", f)  # types.InputFile
+        if hasattr(f, "seek"):
+            f.seek(0)
+
+
+_process_request = None  # asyncio_helper's own, once install has wrapped it
+_installed = None
+
+Gauge("bot_send_queue", "Bot API requests waiting for their rate-limit slot",
+      lambda: _installed.metrics()["queued"] if _installed else 0)
+
+
+def _asyncio_helper():
+    # asyncio_helper pulls in aiohttp, which takes longer to import than the rest of telebot;
+    # it is only patched in processes that already use it, so import asyncio code before these calls
+    return sys.modules.get("telebot.asyncio_helper")
+
+
+def use_api_server(url):
+    """Send every Bot API request of this process to ``url`` instead of api.telegram.org."""
+    url = url.rstrip("/")
+    apihelper.API_URL = url + "/bot{0}/{1}"
+    apihelper.FILE_URL = url + "/file/bot{0}/{1}"
+    asyncio_helper = _asyncio_helper()
+    if asyncio_helper:
+        asyncio_helper.API_URL, asyncio_helper.FILE_URL = apihelper.API_URL, apihelper.FILE_URL
+
+
+def install(scheduler):
+    """Route every Bot API request of this process, threaded and asyncio, through ``scheduler``."""
+    global _installed, _process_request
+    apihelper.CUSTOM_REQUEST_SENDER = scheduler.send
+    asyncio_helper = _asyncio_helper()
+    if asyncio_helper:
+        _process_request = _process_request or asyncio_helper._process_request
+        asyncio_helper._process_request = scheduler.wrap_async(_process_request)
+    _installed = scheduler
+    return scheduler
@@ -0,0 +1,131 @@
+import re
+from bisect import bisect_left, insort
+
+FIELDS = ("button_name", "folder_name", "description", "media")  # best match first when ranking
+EXACT, PREFIX, FUZZY = 0, 1, 2
+MIN_FUZZY = 3  # shorter words are too easily one typo away from something else
+
+
+def words(text):
+    # Underscores split too, so "Box_3f9a2c" is found by "3f9a"
+    return re.findall(r"[^\W_]+", str(text or "").lower())
+
+
+def deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class SearchIndex:
+    """Inverted index over the text of every box, for search as you type.
+
+    Each word of a box's button label, folder name, description and media path maps to the
+    boxes holding it. The words are also kept sorted, so all words starting with what was typed
+    are one bisect away, and filed under every way of dropping one letter from them, so words one
+    typo away are looked up rather than scanned for. Boxes are added, updated and removed one at
+    a time as they change.
+    """
+
+    def __init__(self):
+        self.postings = {}   # word -> one {box: None} per field rank, for the boxes whose best field holding it has that rank
+        self.vocabulary = []  # every word, sorted
+        self.variants = {}   # word with one letter dropped -> {words}
+        self.box_words = {}  # box -> {word: field rank}
+
+    def add(self, box):
+        found = {}
+        for rank, field in enumerate(FIELDS):
+            for word in words(getattr(box, field)):
+                found.setdefault(word, rank)
+        self.box_words[box] = found
+        for word, rank in found.items():
+            by_rank = self.postings.get(word)
+            if by_rank is None:
+                by_rank = self.postings[word] = [{} for _ in FIELDS]
+                insort(self.vocabulary, word)
+                if len(word) >= MIN_FUZZY:
+                    for variant in deletes(word):
+                        self.variants.setdefault(variant, set()).add(word)
+            by_rank[rank][box] = None
+
+    def remove(self, box):
+        for word, rank in self.box_words.pop(box, {}).items():
+            by_rank = self.postings[word]
+            del by_rank[rank][box]
+            if any(by_rank):
+                continue
+            del self.postings[word]
+            del self.vocabulary[bisect_left(self.vocabulary, word)]
+            if len(word) >= MIN_FUZZY:
+                for variant in deletes(word):
+                    self.variants[variant].discard(word)
+                    if not self.variants[variant]:
+                        del self.variants[variant]
+
+    def update(self, box):
+        self.remove(box)
+        self.add(box)
+
+    def matches(self, term):
+        """Indexed words matching ``term``: {word: EXACT, PREFIX or FUZZY}, best first."""
+        found = {term: EXACT} if term in self.postings else {}
+        start = bisect_left(self.vocabulary, term)
+        for word in self.vocabulary[start:start + 1000]:  # a short prefix is refined by the next keystroke
+            if not word.startswith(term):
+                break
+            found.setdefault(word, PREFIX)
+        if len(term) >= MIN_FUZZY:
+            # One letter too many, too few, or wrong (both sides with a letter dropped)
+            near = set(self.variants.get(term, ()))
+            for variant in deletes(term):
+                if variant in self.postings:
+                    near.add(variant)
+                near.update(self.variants.get(variant, ()))
+            for word in sorted(near):
+                found.setdefault(word, FUZZY)
+        return found
+
+    def search(self, query, limit=50):
+        """Boxes holding a match for every word of ``query``, best first, at most ``limit``.
+
+        The last word may be unfinished. A box ranks higher for exact over prefix over fuzzy
+        matches, and for matches in its button label over its folder, description and media.
+        Boxes are visited in that order for the most selective word, so the walk can stop at
+        ``limit``: exact for one-word queries, while other words only reorder what was found.
+        """
+        terms = words(query)
+        if not terms:
+            return []
+        term_matches = [self.matches(term) for term in terms]
+        if not all(term_matches):
+            return []
+        # Walk the boxes of the most selective word's matches, best match first, and check the
+        # other words against each box's own few words; stop once ``limit`` boxes qualify
+        term_matches.sort(key=lambda found: sum(len(boxes) for word in found for boxes in self.postings[word]))
+        first, rest = term_matches[0], term_matches[1:]
+        kinds = {}
+        for word, kind in first.items():
+            kinds.setdefault(kind, []).append(word)
+        walk = ((kind, rank, box) for kind in sorted(kinds) for rank in range(len(FIELDS))
+                for word in kinds[kind] for box in self.postings[word][rank])
+        scores, seen = {}, set()
+        for kind, rank, box in walk:
+            if box in seen:
+                continue  # already scored through a better match
+            seen.add(box)
+            score, own = [kind, rank], self.box_words[box]
+            for other in rest:
+                best = min(((k, own[w]) for w, k in other.items() if w in own), default=None) \
+                    if len(other) < len(own) else \
+                    min(((other[w], r) for w, r in own.items() if w in other), default=None)
+                if best is None:
+                    break
+                score[0] += best[0]
+                score[1] += best[1]
+            else:
+                scores[box] = tuple(score)
+                if len(scores) == limit:
+                    return sorted(scores, key=scores.get)
+        return sorted(scores, key=scores.get)
+
+    def __len__(self):
+        return len(self.box_words)
@@ -0,0 +1,192 @@
+import json, time, socket, sqlite3, threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+from menu import BACK
+from metrics import CALLBACKS, MENU_LOOKUP_SECONDS
+
+MAX_DEPTH = 50             # screens remembered per chat
+SESSION_TTL = 30 * 86400   # forget chats idle for this long (seconds)
+
+
+def navigate(menu, sessions, chat_id, callback_data):
+    """(node id, text, media) for a tapped button, keeping the chat's navigation stack in ``sessions``.
+
+    A button pushes its screen, Back pops back to the screen it was tapped from.
+    Stale buttons and nodes removed by a reload lead to the main menu.
+    """
+    with MENU_LOOKUP_SECONDS.time():
+        stack = [node_id for node_id in sessions.get(chat_id) if node_id in menu.nodes]
+        if callback_data == BACK:
+            if stack:
+                stack.pop()
+            node_id = stack[-1] if stack else ""
+        else:
+            node_id = menu.keys.get(callback_data, "")
+            if not node_id:
+                stack = []
+            elif not stack or stack[-1] != node_id:
+                stack.append(node_id)
+        sessions.set(chat_id, stack[-MAX_DEPTH:])
+        screen = menu.show(node_id)
+    CALLBACKS.inc(node=node_id or "/")
+    return screen
+
+
+class MemorySessions:
+    """Navigation stacks of the most recently active ``max_chats`` chats, in this process only."""
+
+    def __init__(self, max_chats=100000, ttl=SESSION_TTL):
+        self.max_chats, self.ttl = max_chats, ttl
+        self.entries = OrderedDict()  # chat id -> (last use, stack), least recently used first
+        self.lock = threading.Lock()
+
+    def get(self, chat_id):
+        with self.lock:
+            entry = self.entries.get(chat_id)
+            if entry is None or entry[0] < time.monotonic() - self.ttl:
+                return []
+            return list(entry[1])
+
+    def set(self, chat_id, stack):
+        now = time.monotonic()
+        with self.lock:
+            self.entries.pop(chat_id, None)
+            if stack:
+                self.entries[chat_id] = (now, tuple(stack))
+            while self.entries:
+                oldest, (used, _) = next(iter(self.entries.items()))
+                if len(self.entries) <= self.max_chats and used >= now - self.ttl:
+                    break
+                del self.entries[oldest]
+
+    def delete(self, chat_id):
+        with self.lock:
+            self.entries.pop(chat_id, None)
+
+
+class SqliteSessions:
+    """Navigation stacks in a SQLite file, shared by every bot process on the same machine."""
+
+    def __init__(self, path, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                        "(chat_id TEXT PRIMARY KEY, stack TEXT NOT NULL, touched REAL NOT NULL)")
+        self.writes = 0
+
+    def get(self, chat_id):
+        with self.lock:
+            row = self.db.execute("SELECT stack FROM sessions WHERE chat_id = ? AND touched >= ?",
+                                  (str(chat_id), time.time() - self.ttl)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def set(self, chat_id, stack):
+        if not stack:
+            return self.delete(chat_id)
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                            (str(chat_id), json.dumps(stack, ensure_ascii=False), now))
+            self.writes += 1
+            if self.writes % 1000 == 0:
+                self.db.execute("DELETE FROM sessions WHERE touched < ?", (now - self.ttl,))
+
+    def delete(self, chat_id):
+        with self.lock:
+            self.db.execute("DELETE FROM sessions WHERE chat_id = ?", (str(chat_id),))
+
+
+class RespError(RuntimeError):
+    pass
+
+
+class RedisSessions:
+    """Navigation stacks in Redis (or any server speaking its protocol), shared by bots on any machine.
+
+    Speaks just enough RESP for GET/SET/DEL over one connection per thread; keys expire after ``ttl``.
+    """
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, ttl=SESSION_TTL, prefix="tgmenu:nav:"):
+        self.address, self.db, self.password = (host, port), db, password
+        self.ttl, self.prefix = ttl, prefix
+        self.local = threading.local()
+
+    def _connect(self):
+        conn = socket.create_connection(self.address, timeout=5)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.local.conn, self.local.reader = conn, conn.makefile("rb")
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def command(self, *args):
+        for attempt in range(2):
+            if getattr(self.local, "conn", None) is None:
+                self._connect()
+            try:
+                return self._call(*args)
+            except (OSError, EOFError):
+                # Server restarted or the idle connection was dropped; reconnect once
+                self.local.conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+
+    def _call(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.local.conn.sendall(b"".join(parts))
+        return self._reply()
+
+    def _reply(self):
+        line = self.local.reader.readline()
+        if not line:
+            raise EOFError("connection closed by the session server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            if int(rest) < 0:
+                return None
+            data = self.local.reader.read(int(rest) + 2)
+            return data[:-2]
+        if kind == b"*":
+            return None if int(rest) < 0 else [self._reply() for _ in range(int(rest))]
+        raise RespError(f"unexpected reply {line!r}")
+
+    def get(self, chat_id):
+        data = self.command("GET", f"{self.prefix}{chat_id}")
+        return json.loads(data) if data else []
+
+    def set(self, chat_id, stack):
+        if not stack:
+            return self.delete(chat_id)
+        self.command("SET", f"{self.prefix}{chat_id}", json.dumps(stack, ensure_ascii=False), "EX", self.ttl)
+
+    def delete(self, chat_id):
+        self.command("DEL", f"{self.prefix}{chat_id}")
+
+
+def open_sessions(url=None):
+    """Session store for ``url``: none or "memory", "sqlite:///path/to/file.db" or "redis://[:password@]host[:port][/db]"."""
+    if not url or url == "memory":
+        return MemorySessions()
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        # sqlite:///sessions.db is relative to the working directory, sqlite:////var/lib/bot.db absolute
+        path = parsed.netloc + parsed.path
+        return SqliteSessions(path[1:] if path.startswith("/") else path)
+    if parsed.scheme == "redis":
+        return RedisSessions(parsed.hostname or "127.0.0.1", parsed.port or 6379,
+                             int(parsed.path.strip("/") or 0), parsed.password)
+    raise ValueError(f"unknown session store {url!r}")
@@ -0,0 +1,137 @@
+import os, json, time, tempfile, threading, multiprocessing
+from pathlib import Path
+from telebot import apihelper, types
+from menu import MODULES_PATH, MenuLoader
+from bundle import BundleLoader, write_bundle
+from webhook import WebhookServer
+
+
+def chat_id_of(update):
+    """Chat a raw update (decoded JSON) belongs to, as dispatcher.chat_key finds it for parsed ones."""
+    for kind, event in update.items():
+        if not isinstance(event, dict):
+            continue
+        if kind == "callback_query" and event.get("message"):
+            event = event["message"]
+        chat = event.get("chat") or event.get("from")
+        if chat:
+            return chat["id"]
+    return update["update_id"]
+
+
+def worker(index, updates, token, bundle, options):
+    """Body of one worker process: serves the updates the receiver routes to it.
+
+    ``options`` are deploy_bot.py's command line arguments.
+    """
+    import metrics
+    from deploy_bot import build_bot
+    from media_cache import MediaCache
+    from media_pipeline import Derivatives
+    from outbound import OutboundScheduler, install, use_api_server
+    from sessions import open_sessions
+    from subscribers import SUBSCRIBERS_PATH, ChatLog
+
+    if options.log_json:
+        metrics.enable_logs()
+    if options.metrics:
+        # One endpoint per worker, each a separate Prometheus target
+        host, _, port = str(options.metrics).rpartition(":")
+        metrics.serve(f"{host}:{int(port) + index}")
+    if options.api_server:
+        use_api_server(options.api_server)
+    # Chats are split between the workers, the global send rate too
+    install(OutboundScheduler(rate=options.rate / options.processes, chat_rate=options.chat_rate))
+    # Every worker maps the same bundle file: the menu is shared read-only through the page cache
+    menu_loader = BundleLoader(bundle)
+    menu_loader.reload()
+    menu_loader.watch()
+    bot = build_bot(token, menu_loader, MediaCache(derivatives=Derivatives()), open_sessions(options.sessions),
+                    ChatLog(SUBSCRIBERS_PATH), options.workers)
+    print(f"[Bot] Worker {index} ready (pid {os.getpid()})")
+    try:
+        while True:
+            bot.process_new_updates([types.Update.de_json(update) for update in updates.get()])
+    except KeyboardInterrupt:
+        pass
+
+
+class Receiver:
+    """Fetches updates in one process and hands them to ``processes`` worker processes.
+
+    Updates are routed by chat id, so each chat is always served by the same worker and its
+    updates stay in order; per-chat state (rate limits, in-memory sessions) never needs sharing.
+    Each worker queue holds at most ``max_pending`` batches before the receiver waits.
+    """
+
+    def __init__(self, token, processes, worker_args, max_pending=1000):
+        self.token, self.worker_args = token, worker_args
+        self.context = multiprocessing.get_context("spawn")
+        self.queues = [self.context.Queue(max_pending) for _ in range(processes)]
+        self.workers = [None] * processes
+
+    def start(self):
+        for index in range(len(self.workers)):
+            self._start_worker(index)
+        threading.Thread(target=self._supervise, daemon=True).start()
+
+    def _start_worker(self, index):
+        process = self.context.Process(target=worker, args=(index, self.queues[index], self.token, *self.worker_args),
+                                       name=f"bot-worker-{index}", daemon=True)
+        process.start()
+        self.workers[index] = process
+
+    def _supervise(self, interval=5.0):
+        while True:
+            time.sleep(interval)
+            for index, process in enumerate(self.workers):
+                if not process.is_alive():
+                    print(f"[Bot] Worker {index} exited with code {process.exitcode}, restarting it")
+                    self._start_worker(index)
+
+    def route(self, updates):
+        batches = {}
+        for update in updates:
+            batches.setdefault(chat_id_of(update) % len(self.queues), []).append(update)
+        for index, batch in batches.items():
+            self.queues[index].put(batch)
+
+    def poll(self, timeout=20):
+        apihelper.delete_webhook(self.token)
+        offset = None
+        while True:
+            try:
+                updates = apihelper.get_updates(self.token, offset, timeout=timeout + 5, long_polling_timeout=timeout)
+            except Exception as e:
+                print(f"[Bot] Fetching updates failed, retrying: {e}")
+                time.sleep(3)
+                continue
+            if updates:
+                offset = updates[-1]["update_id"] + 1
+                self.route(updates)
+
+    def serve_webhook(self, webhook):
+        # Bodies are routed as decoded JSON; only the worker that handles an update parses it
+        server = WebhookServer((webhook.listen, webhook.port), webhook.secret, self.route, parse=json.loads)
+        apihelper.set_webhook(self.token, url=webhook.url, secret_token=webhook.secret)
+        server.serve_forever()
+
+
+def run_sharded(token, options, webhook=None):
+    """Serve the bot from ``options.processes`` worker processes behind a single update receiver."""
+    processes, bundle = options.processes, options.bundle
+    if bundle is None:
+        # Compile root-menu/ once for all workers and recompile it whenever it changes
+        menu_loader = MenuLoader(MODULES_PATH)
+        menu_loader.reload()
+        bundle = Path(tempfile.mkdtemp(prefix="tgmenu-")) / "menu.bundle"
+        write_bundle(menu_loader.menu, bundle)
+        menu_loader.watch(on_reload=lambda menu: write_bundle(menu, bundle))
+    receiver = Receiver(token, processes, (str(bundle), options))
+    receiver.start()
+    if webhook:
+        print(f"[Bot] Receiving webhook updates on {webhook.listen}:{webhook.port} for {processes} workers (deployment mode)…")
+        receiver.serve_webhook(webhook)
+    else:
+        print(f"[Bot] Starting polling for {processes} workers (deployment mode)…")
+        receiver.poll()
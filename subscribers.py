@@ -0,0 +1,109 @@
+import os, struct, threading
+from pathlib import Path
+
+SUBSCRIBERS_PATH = Path("subscribers.log")
+
+RECORD = struct.Struct("<Bq")  # (1 = added / 0 = removed, chat id)
+
+
+class ChatLog:
+    """A set of chat ids kept as an append-only file of 9-byte records.
+
+    Every change is one small O_APPEND write, so several bot processes can record into the
+    same file; a crash loses at most the record being written. ``compact`` rewrites the file
+    with just the live ids.
+    """
+
+    def __init__(self, path=SUBSCRIBERS_PATH):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.inode, self.size = None, 0  # the file and how many of its bytes ``ids`` reflects
+        self.ids = self._read()
+
+    @staticmethod
+    def _apply(ids, data):
+        # A torn last record from a crash is ignored; returns the bytes applied
+        whole = len(data) - len(data) % RECORD.size
+        for added, chat_id in RECORD.iter_unpack(data[:whole]):
+            if added:
+                ids[chat_id] = None
+            else:
+                ids.pop(chat_id, None)
+        return whole
+
+    def _read(self):
+        ids = {}  # dict as an insertion-ordered set
+        self.inode, self.size = None, 0
+        if self.path.exists():
+            with open(self.path, "rb") as f:
+                self.inode = os.fstat(f.fileno()).st_ino
+                self.size = self._apply(ids, f.read())
+        return ids
+
+    def _refresh(self):
+        # The file only grows until ``compact`` replaces it, so only the new tail needs reading
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self.inode is not None:
+                self.ids = self._read()
+            return
+        if (st.st_ino, st.st_size) == (self.inode, self.size):
+            return
+        if st.st_ino != self.inode or st.st_size < self.size:
+            self.ids = self._read()
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.size)
+            self.size += self._apply(self.ids, f.read(st.st_size - self.size))
+
+    def reload(self):
+        """Pick up records other processes appended."""
+        with self.lock:
+            self._refresh()
+
+    def _append(self, added, chat_id):
+        with open(self.path, "ab", buffering=0) as f:
+            f.write(RECORD.pack(added, chat_id))
+            end, inode = f.tell(), os.fstat(f.fileno()).st_ino
+        # If other processes appended since, leave ``size`` alone: the next refresh reads their
+        # records and this one again
+        if end == self.size + RECORD.size and self.inode in (None, inode):
+            self.inode, self.size = inode, end
+
+    def add(self, chat_id):
+        with self.lock:
+            # Another process (broadcast.py) may have removed the chat since; check the file then
+            if chat_id in self.ids:
+                self._refresh()
+            if chat_id in self.ids:
+                return False
+            self.ids[chat_id] = None
+            self._append(1, chat_id)
+        return True
+
+    def discard(self, chat_id):
+        with self.lock:
+            if chat_id not in self.ids:
+                return
+            del self.ids[chat_id]
+            self._append(0, chat_id)
+
+    def compact(self):
+        self.reload()
+        with self.lock:
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            data = b"".join(RECORD.pack(1, chat_id) for chat_id in self.ids)
+            tmp.write_bytes(data)
+            os.replace(tmp, self.path)
+            self.inode, self.size = os.stat(self.path).st_ino, len(data)
+
+    def __contains__(self, chat_id):
+        return chat_id in self.ids
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
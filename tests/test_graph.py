@@ -0,0 +1,80 @@
+import random
+import yaml
+from graph import (BOX_WIDTH, Box, Link, MenuGraph, auto_layout, export_graph, import_graph, load_graph, save_graph,
+                   to_nodes, write_layout)
+from menu import load_nodes
+
+
+def test_write_layout_removes_stale_folders(tmp_path):
+    saved = {}
+    write_layout(tmp_path, {"a": {"label": "A"}, "a/b": {"label": "B"}, "a/b/c": {"label": "C"}}, saved)
+    (tmp_path / "a" / "b" / "notes.txt").write_text("not ours")
+    write_layout(tmp_path, {"a": {"label": "A2"}}, saved)
+    assert saved == {"a": {"label": "A2"}}
+    assert yaml.safe_load((tmp_path / "a" / "info.yaml").read_text()) == {"label": "A2"}
+    assert not (tmp_path / "a" / "b" / "c").exists()
+    assert not (tmp_path / "a" / "b" / "info.yaml").exists()
+    assert (tmp_path / "a" / "b" / "notes.txt").exists()  # other files keep their folder
+
+
+def test_write_layout_skips_unchanged(tmp_path):
+    saved = {}
+    write_layout(tmp_path, {"a": {"label": "A"}}, saved)
+    (tmp_path / "a" / "info.yaml").write_text("label: edited by hand\n")
+    write_layout(tmp_path, {"a": {"label": "A"}}, saved)
+    assert (tmp_path / "a" / "info.yaml").read_text() == "label: edited by hand\n"
+
+
+def random_graph(n, extra_links, seed=1):
+    rng = random.Random(seed)
+    graph = MenuGraph()
+    boxes = [graph.add_box(Box(f"Box_{i}")) for i in range(n)]
+    for i in range(1, n):
+        graph.add_link(Link(boxes[rng.randrange(i)], boxes[i]))
+    for _ in range(extra_links):
+        graph.add_link(Link(rng.choice(boxes), rng.choice(boxes)))
+    return graph
+
+
+def test_auto_layout_rows_do_not_overlap():
+    graph = random_graph(300, extra_links=120)
+    positions = auto_layout(graph)
+    assert set(positions) == set(graph.boxes)
+    rows = {}
+    for x, y in positions.values():
+        rows.setdefault(y, []).append(x)
+    assert len(rows) > 1
+    for xs in rows.values():
+        xs.sort()
+        assert all(b - a >= BOX_WIDTH for a, b in zip(xs, xs[1:]))
+    assert min(x for x, _ in positions.values()) == 0
+
+
+def test_auto_layout_puts_children_below_parents():
+    graph = random_graph(50, extra_links=0)
+    positions = auto_layout(graph)
+    for link in graph.links:
+        assert positions[link.end_box][1] > positions[link.start_box][1]
+
+
+def hand_written_project(root):
+    # No children: lists, as people write them by hand (and older editors saved them stale)
+    for rel, label in (("About", "About"), ("Shop", "Shop"), ("Shop/Shoes", "Shoes"), ("Loose/Orphan", "Orphan")):
+        (root / rel).mkdir(parents=True)
+        (root / rel / "info.yaml").write_text(yaml.safe_dump({"label": label, "description": label}))
+    (root / "main_menu.txt").write_text("Hello")
+
+
+def test_load_graph_links_boxes_by_folder_nesting(tmp_path):
+    hand_written_project(tmp_path)
+    graph, saved = load_graph(tmp_path)
+    assert sorted(saved) == ["About", "Shop", "Shop/Shoes"]  # Loose/ is no box, so the bot never shows Orphan
+    nodes = to_nodes(graph)
+    assert nodes[""].children == ("About", "Shop") and nodes["Shop"].children == ("Shop/Shoes",)
+    assert nodes == dict(load_nodes(tmp_path))
+
+
+def test_export_import_round_trip_keeps_folders(tmp_path):
+    hand_written_project(tmp_path / "a")
+    save_graph(import_graph(export_graph(load_graph(tmp_path / "a")[0])), tmp_path / "b")
+    assert dict(load_nodes(tmp_path / "b")) == dict(load_nodes(tmp_path / "a"))
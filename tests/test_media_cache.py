@@ -0,0 +1,75 @@
+import threading
+import pytest
+import telebot
+from telebot import apihelper
+from benchmark import TOKEN, FakeBotAPI
+from media_cache import MediaCache
+from outbound import use_api_server
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(apihelper, "API_URL", apihelper.API_URL)
+    monkeypatch.setattr(apihelper, "FILE_URL", apihelper.FILE_URL)
+    server = FakeBotAPI()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    use_api_server(server.url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(1000))
+    return str(path)
+
+
+def test_photo_is_uploaded_once(api, photo, tmp_path):
+    bot = telebot.TeleBot(TOKEN)
+    cache = MediaCache(tmp_path / "media_cache.json")
+    for chat_id in (1, 2, 3):
+        cache.send_photo(bot, chat_id, photo, caption="hi")
+    assert api.calls["sendPhoto"] == 3
+    assert 1008 <= api.upload_bytes < 2 * 1008
+    assert MediaCache(tmp_path / "media_cache.json").get(photo) == "file1"
+
+
+def test_changed_photo_is_uploaded_again(api, photo, tmp_path):
+    bot = telebot.TeleBot(TOKEN)
+    cache = MediaCache(tmp_path / "media_cache.json")
+    cache.send_photo(bot, 1, photo)
+    with open(photo, "ab") as f:
+        f.write(b"more")
+    cache.send_photo(bot, 1, photo)
+    cache.send_photo(bot, 1, photo)
+    assert api.upload_bytes == 1008 + 1012
+    assert cache.get(photo) == "file2"
+
+
+def test_processes_sharing_the_cache_keep_each_others_entries(tmp_path):
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    first.write_bytes(b"a")
+    second.write_bytes(b"b")
+    path = tmp_path / "media_cache.json"
+    one, two = MediaCache(path), MediaCache(path)
+    one.put(str(first), "file_a")
+    two.put(str(second), "file_b")
+    assert two.get(str(first)) == "file_a"
+    one.discard(str(second))
+    assert set(MediaCache(path).entries) == {str(first)}
+
+
+def test_entry_discarded_by_another_process_stays_gone(tmp_path):
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    first.write_bytes(b"a")
+    second.write_bytes(b"b")
+    path = tmp_path / "media_cache.json"
+    one = MediaCache(path)
+    one.put(str(first), "file_a")
+    two = MediaCache(path)
+    two.discard(str(first))
+    one.put(str(second), "file_b")
+    assert set(MediaCache(path).entries) == {str(second)}
+    assert one.get(str(first)) is None
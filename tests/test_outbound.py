@@ -0,0 +1,56 @@
+import pytest
+from outbound import Bucket, OutboundScheduler, OutboundQueueFull
+
+
+def test_bucket_allows_burst_then_paces():
+    bucket = Bucket(rate=1, burst=3)
+    now = 100.0
+    slots = []
+    for _ in range(5):
+        at = bucket.earliest(now)
+        bucket.book(at)
+        slots.append(at - now)
+    assert slots == [0, 0, 0, 1, 2]
+
+
+def test_bucket_hold():
+    bucket = Bucket(rate=1, burst=3)
+    bucket.hold(130.0)
+    assert bucket.earliest(100.0) == 130.0
+
+
+def test_chat_is_paced_to_its_rate():
+    scheduler = OutboundScheduler(rate=1000, chat_rate=1, burst=1)
+    assert scheduler.reserve(111) <= 0
+    assert scheduler.reserve(111) == pytest.approx(1, abs=0.05)
+    assert scheduler.reserve(111) == pytest.approx(2, abs=0.05)
+
+
+def test_global_rate_spreads_chats():
+    scheduler = OutboundScheduler(rate=10, chat_rate=1, burst=1)
+    scheduler.global_bucket = Bucket(10, 1)
+    waits = []
+    for chat_id in range(5):
+        assert scheduler.reserve(chat_id) <= 0
+        waits.append(scheduler.reserve_global())
+    assert waits[-1] == pytest.approx(0.4, abs=0.05)
+
+
+def test_held_chat_does_not_delay_others():
+    scheduler = OutboundScheduler()
+    scheduler.flood(111, 30, "sendMessage")
+    assert scheduler.reserve(111) == pytest.approx(30, abs=0.1)
+    for _ in range(6):
+        scheduler.reserve(111)
+    assert scheduler.reserve(222) <= 0
+    assert scheduler.reserve_global() <= 0.1
+
+
+def test_queue_limit():
+    scheduler = OutboundScheduler(chat_rate=1, burst=1, max_queue=2)
+    scheduler.reserve(1)
+    scheduler.reserve(1)
+    scheduler.reserve(1)
+    with pytest.raises(OutboundQueueFull):
+        scheduler.reserve(1)
+    assert scheduler.metrics()["rejected"] == 1
@@ -0,0 +1,53 @@
+from graph import Box
+from search import SearchIndex, words
+
+
+def index_of(*boxes):
+    index = SearchIndex()
+    for box in boxes:
+        index.add(box)
+    return index
+
+
+def test_words_split_underscores_and_case():
+    assert words("Box_3F9a2c Summer-Offers") == ["box", "3f9a2c", "summer", "offers"]
+
+
+def test_prefix_and_exact_ranking():
+    shoes, shop = Box("Shoes", "Shoes"), Box("Shop", "Shop")
+    index = index_of(shoes, shop)
+    assert set(index.search("sho")) == {shoes, shop}
+    assert index.search("shop") == [shop]
+    assert index.search("shop sh") == [shop]
+
+
+def test_fuzzy_match_one_typo():
+    pricing = Box("Pricing", "Pricing")
+    index = index_of(pricing, Box("Contact", "Contact"))
+    assert index.search("prcing") == [pricing]     # letter missing
+    assert index.search("pricingg") == [pricing]   # letter too many
+    assert index.search("pricong") == [pricing]    # letter wrong
+    assert index.search("zzz") == []
+
+
+def test_label_beats_description_within_limit():
+    boxes = [Box(f"Box_{i}", f"Item {i}", "see our pricing") for i in range(60)]
+    labelled = Box("Pricing", "Pricing")
+    index = index_of(*boxes, labelled)
+    hits = index.search("pricing", 50)
+    assert len(hits) == 50
+    assert hits[0] is labelled
+
+
+def test_update_and_remove():
+    box = Box("Box_1", "Old name")
+    index = index_of(box, Box("Box_2", "Other"))
+    box.button_name = "New name"
+    index.update(box)
+    assert index.search("old") == []
+    assert index.search("new") == [box]
+    index.remove(box)
+    assert index.search("new") == []
+    assert "new" not in index.postings and "new" not in index.vocabulary
+    assert not any("new" in variants for variants in index.variants.values())
+    assert len(index) == 1
@@ -0,0 +1,127 @@
+import socket, threading
+import pytest
+import sessions
+from sessions import MemorySessions, RedisSessions, RespError
+
+
+def test_memory_sessions_evict_least_recently_used():
+    store = MemorySessions(max_chats=2)
+    store.set(1, ["a"])
+    store.set(2, ["b"])
+    store.set(1, ["a", "c"])  # 1 is now the most recently used
+    store.set(3, ["d"])
+    assert store.get(2) == []
+    assert store.get(1) == ["a", "c"] and store.get(3) == ["d"]
+
+
+def test_memory_sessions_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sessions.time, "monotonic", lambda: now[0])
+    store = MemorySessions(ttl=60)
+    store.set(1, ["a"])
+    now[0] += 30
+    store.set(2, ["b"])
+    now[0] += 40
+    assert store.get(1) == [] and store.get(2) == ["b"]
+    store.set(3, ["c"])  # a write drops the expired chats
+    assert list(store.entries) == [2, 3]
+
+
+def test_memory_sessions_empty_stack_deletes():
+    store = MemorySessions()
+    store.set(1, ["a"])
+    store.set(1, [])
+    assert 1 not in store.entries
+
+
+class FakeRedis:
+    """Answers GET/SET/DEL/AUTH/SELECT in RESP from a dict, one thread per connection."""
+
+    def __init__(self, password=None):
+        self.password, self.data, self.commands, self.conns = password, {}, [], []
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        reader = conn.makefile("rb")
+        try:
+            while True:
+                line = reader.readline()
+                if not line:
+                    return
+                args = []
+                for _ in range(int(line[1:-2])):
+                    size = int(reader.readline()[1:-2])
+                    args.append(reader.read(size + 2)[:-2])
+                conn.sendall(self._reply(args))
+        except OSError:
+            pass
+
+    def _reply(self, args):
+        name = args[0].decode().upper()
+        self.commands.append(name)
+        if name == "AUTH":
+            return b"+OK\r\n" if args[1].decode() == self.password else b"-WRONGPASS invalid password\r\n"
+        if name == "SELECT":
+            return b"+OK\r\n"
+        if name == "GET":
+            value = self.data.get(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == "SET":
+            self.data[args[1]] = args[2]
+            return b"+OK\r\n"
+        if name == "DEL":
+            return b":%d\r\n" % (self.data.pop(args[1], None) is not None)
+        return b"-ERR unknown command\r\n"
+
+    def drop_connections(self):
+        for conn in self.conns:
+            conn.shutdown(socket.SHUT_RDWR)
+            conn.close()
+        self.conns.clear()
+
+    def close(self):
+        self.server.close()
+        self.drop_connections()
+
+
+@pytest.fixture
+def redis():
+    server = FakeRedis(password="secret")
+    yield server
+    server.close()
+
+
+def test_redis_sessions_round_trip(redis):
+    store = RedisSessions(port=redis.port, db=2, password="secret", prefix="t:")
+    assert store.get(1) == []
+    store.set(1, ["a", "Ünïcode"])
+    assert store.get(1) == ["a", "Ünïcode"]
+    assert redis.data[b"t:1"] == '["a", "Ünïcode"]'.encode("utf-8")
+    store.set(1, [])
+    assert store.get(1) == [] and b"t:1" not in redis.data
+    assert redis.commands[:2] == ["AUTH", "SELECT"]
+
+
+def test_redis_sessions_reconnect_once(redis):
+    store = RedisSessions(port=redis.port, password="secret")
+    store.set(1, ["a"])
+    redis.drop_connections()
+    assert store.get(1) == ["a"]
+    assert redis.commands.count("AUTH") == 2
+
+
+def test_redis_sessions_error_reply(redis):
+    store = RedisSessions(port=redis.port, password="wrong")
+    with pytest.raises(RespError, match="WRONGPASS"):
+        store.get(1)
@@ -0,0 +1,65 @@
+from subscribers import RECORD, ChatLog
+
+
+def test_add_discard_and_reopen(tmp_path):
+    path = tmp_path / "subscribers.log"
+    log = ChatLog(path)
+    assert log.add(1) and log.add(2) and log.add(-100)
+    assert not log.add(1)
+    log.discard(2)
+    assert list(ChatLog(path)) == [1, -100]
+    assert path.stat().st_size == 4 * RECORD.size
+
+
+def test_torn_trailing_record_is_ignored(tmp_path):
+    path = tmp_path / "subscribers.log"
+    path.write_bytes(RECORD.pack(1, 5) + RECORD.pack(1, 6) + RECORD.pack(1, 7)[:4])
+    log = ChatLog(path)
+    assert list(log) == [5, 6]
+    assert 7 not in log
+
+
+def test_compact_keeps_live_ids(tmp_path):
+    path = tmp_path / "subscribers.log"
+    log = ChatLog(path)
+    for chat_id in range(10):
+        log.add(chat_id)
+    for chat_id in range(0, 10, 2):
+        log.discard(chat_id)
+    log.compact()
+    assert path.stat().st_size == 5 * RECORD.size
+    assert list(ChatLog(path)) == [1, 3, 5, 7, 9]
+
+
+def test_add_after_removal_by_another_process(tmp_path):
+    path = tmp_path / "subscribers.log"
+    bot = ChatLog(path)
+    bot.add(42)
+    broadcast = ChatLog(path)
+    broadcast.discard(42)  # the user had blocked the bot
+    assert bot.add(42)  # ...and pressed /start again
+    assert 42 in ChatLog(path)
+
+
+def test_interleaved_appends_from_two_processes(tmp_path):
+    path = tmp_path / "subscribers.log"
+    one, two = ChatLog(path), ChatLog(path)
+    for chat_id in range(20):
+        (one if chat_id % 3 else two).add(chat_id)
+    two.discard(0)
+    one.reload()
+    assert set(one) == set(range(1, 20)) == set(ChatLog(path))
+    assert one.add(0) and 0 in ChatLog(path)
+
+
+def test_reload_after_compact_by_another_process(tmp_path):
+    path = tmp_path / "subscribers.log"
+    bot, broadcast = ChatLog(path), ChatLog(path)
+    for chat_id in range(5):
+        bot.add(chat_id)
+    broadcast.reload()
+    broadcast.discard(1)
+    broadcast.compact()
+    broadcast.add(9)
+    bot.reload()
+    assert list(bot) == [0, 2, 3, 4, 9]
@@ -0,0 +1,46 @@
+import json, threading
+import urllib.request
+from urllib.error import HTTPError
+import pytest
+from webhook import SECRET_HEADER, WebhookServer
+
+UPDATE = {"update_id": 7, "message": {"message_id": 1, "date": 1, "chat": {"id": 5, "type": "private"}, "text": "/start"}}
+
+
+@pytest.fixture
+def server():
+    received = []
+    server = WebhookServer(("127.0.0.1", 0), "s3cret", received.extend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.received = received
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body, secret="s3cret"):
+    headers = {SECRET_HEADER: secret} if secret is not None else {}
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/", data=body, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except HTTPError as e:
+        return e.code
+
+
+def test_update_is_submitted(server):
+    assert post(server, json.dumps(UPDATE).encode()) == 200
+    [update] = server.received
+    assert update.update_id == 7 and update.message.text == "/start"
+
+
+def test_wrong_or_missing_secret_is_rejected(server):
+    assert post(server, json.dumps(UPDATE).encode(), secret="guess") == 403
+    assert post(server, json.dumps(UPDATE).encode(), secret=None) == 403
+    assert server.received == []
+
+
+def test_bad_body_is_rejected(server):
+    assert post(server, b"not json") == 400
+    assert post(server, b"\xff\xfe") == 400
+    assert server.received == []
@@ -0,0 +1,40 @@
+import hmac
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from telebot import types
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ""), self.server.secret):
+            self.send_error(403)
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            update = self.server.parse(body.decode("utf-8"))
+        except (ValueError, KeyError, TypeError):
+            self.send_error(400)
+            return
+        # Only queue the update here; handlers run on the dispatcher so Telegram gets its 200 right away
+        self.server.submit([update])
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """Receives updates that Telegram POSTs to the bot's webhook URL.
+
+    Requests without the secret token given to setWebhook are rejected. Run it
+    behind a TLS-terminating reverse proxy, as Telegram only calls https URLs.
+    ``parse`` turns the request body into what ``submit`` receives.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, secret, submit, parse=types.Update.de_json):
+        super().__init__(address, WebhookHandler)
+        self.secret, self.submit, self.parse = secret, submit, parse